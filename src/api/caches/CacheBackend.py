@@ -0,0 +1,82 @@
+import threading
+
+BACKEND_MEMORY = 'memory'
+BACKEND_SQLITE = 'sqlite'
+BACKENDS = [BACKEND_MEMORY, BACKEND_SQLITE]
+
+
+class CacheBackend:
+    """
+    Base class of key-value stores used by the caches. Values have to be JSON serializable.
+    Keeps track of hits, misses and evictions (including expired entries).
+    """
+
+    def __init__(self, max_entries, ttl=None):
+        """
+        :param max_entries: Maximum number of entries, the least recently used entries are evicted first
+        :param ttl: Time to live of an entry in seconds, None to keep entries until they are evicted
+        """
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @staticmethod
+    def from_config(config, section, table='cache', enabled=False, ttl=0):
+        """
+        Creates the backend configured in the given section of the config
+        :param enabled: Whether the backend is enabled if the section does not say otherwise
+        :param ttl: Time to live if the section does not define one
+        :return: CacheBackend or None if the cache is disabled
+        """
+        from api.caches import MemoryCacheBackend, SqliteCacheBackend
+
+        if not config.getboolean(section, 'enabled', fallback=enabled):
+            return None
+
+        backend = config.get(section, 'backend', fallback=BACKEND_MEMORY)
+        max_entries = config.getint(section, 'max_entries', fallback=10000)
+        ttl = config.getfloat(section, 'ttl', fallback=ttl) or None
+        if backend == BACKEND_MEMORY:
+            return MemoryCacheBackend(max_entries, ttl)
+        elif backend == BACKEND_SQLITE:
+            return SqliteCacheBackend(config.get(section, 'path', fallback=f'{table}.sqlite'), max_entries, ttl, table)
+        raise ValueError(f'Unknown cache backend {backend}. Expected one of {BACKENDS}')
+
+    def _get(self, key):
+        raise NotImplementedError
+
+    def _put(self, key, value):
+        raise NotImplementedError
+
+    def size(self):
+        raise NotImplementedError
+
+    def get(self, key):
+        """
+        :return: Cached value or None
+        """
+        with self._lock:
+            value = self._get(key)
+            if value is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._put(key, value)
+
+    def statistics(self):
+        with self._lock:
+            requests = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'hit_ratio': self._hits / requests if requests else 0.0,
+                'size': self.size(),
+            }
@@ -0,0 +1,39 @@
+from collections import OrderedDict
+from time import monotonic
+
+from api.caches import CacheBackend
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    LRU cache in memory of the current process
+    """
+
+    def __init__(self, max_entries, ttl=None):
+        super().__init__(max_entries, ttl)
+        self._entries = OrderedDict()  # key -> (expires_at, value), least recently used first
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at is not None and expires_at < monotonic():
+            del self._entries[key]
+            self._evictions += 1
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def _put(self, key, value):
+        expires_at = monotonic() + self._ttl if self._ttl else None
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def size(self):
+        return len(self._entries)
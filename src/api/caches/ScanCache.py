@@ -0,0 +1,165 @@
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from api.caches import CacheBackend
+from puzzle_solver.models.grid_games import Sudoku
+
+log = logging.getLogger(__name__)
+
+SECTION = 'scan_cache'
+HASH_SIZE = 8
+# Sections of the config which change the result of a scan, e.g. the board size or the recognizer
+FINGERPRINT_SECTIONS = ['scanner', 'tesseract']
+
+
+class ScanCache:
+    """
+    Caches the Sudokus recognized in uploaded images, so repeated uploads skip scanning.
+    Looks up the raw bytes of the upload first. Optionally the difference hash (dHash) of the decoded image is used
+    as second key, which also finds re-encoded or slightly changed copies of an image.
+    All keys contain a fingerprint of the scanner config, so scans of another config are never returned.
+    """
+
+    def __init__(self, backend: CacheBackend, perceptual_hash=True, max_distance=0, max_entries=10000,
+                 fingerprint=''):
+        """
+        :param perceptual_hash: Whether to look up images by their dHash if the raw bytes are unknown
+        :param max_distance: Maximum number of differing bits between two hashes to consider the images equal
+        :param max_entries: Maximum number of hashes kept for lookups with max_distance > 0
+        :param fingerprint: Fingerprint of the scanner config, see ScanCache.fingerprint
+        """
+        self._backend = backend
+        self._perceptual_hash = perceptual_hash
+        self._max_distance = max_distance
+        self._max_entries = max_entries
+        self._fingerprint = fingerprint
+        self._hashes = OrderedDict()  # dHash -> None, only used for lookups with max_distance > 0
+        self._lock = threading.Lock()
+        self._counts = {'raw_hits': 0, 'perceptual_hits': 0, 'misses': 0}
+
+    @staticmethod
+    def from_config(config):
+        """
+        :return: ScanCache or None if disabled in the [scan_cache] section
+        """
+        backend = CacheBackend.from_config(config, SECTION, table='scans')
+        if backend is None:
+            return None
+        return ScanCache(backend,
+                         config.getboolean(SECTION, 'perceptual_hash', fallback=True),
+                         config.getint(SECTION, 'max_distance', fallback=0),
+                         config.getint(SECTION, 'max_entries', fallback=10000),
+                         ScanCache.fingerprint(config))
+
+    @staticmethod
+    def fingerprint(config):
+        """
+        :return: Hash of the options which change the result of a scan
+        """
+        options = {section: dict(config.items(section)) for section in FINGERPRINT_SECTIONS
+                   if config.has_section(section)}
+        options['decode_size'] = config.get('upload', 'decode_size', fallback=None)
+        return hashlib.sha256(json.dumps(options, sort_keys=True).encode()).hexdigest()[:16]
+
+    @staticmethod
+    def dhash(image, hash_size=HASH_SIZE):
+        """
+        Computes the difference hash of a grayscale image: whether each pixel of a downscaled version of the image
+        is brighter than its right neighbour
+        :return: Hash as int with hash_size * hash_size bits
+        """
+        small = cv2.resize(image, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+        bits = (small[:, 1:] > small[:, :-1]).flatten()
+        return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+    def _find_similar(self, image_hash):
+        """
+        :return: Closest known hash within max_distance or None
+        """
+        with self._lock:
+            if not self._hashes:
+                return None
+            hashes = np.array(list(self._hashes.keys()), dtype=np.uint64)
+            differing = np.bitwise_xor(hashes, np.uint64(image_hash))
+            distances = np.unpackbits(differing.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+            best = int(np.argmin(distances))
+            if distances[best] > self._max_distance:
+                return None
+            return int(hashes[best])
+
+    def _remember_hash(self, image_hash):
+        with self._lock:
+            self._hashes[image_hash] = None
+            self._hashes.move_to_end(image_hash)
+            while len(self._hashes) > self._max_entries:
+                self._hashes.popitem(last=False)
+
+    def _count(self, counter):
+        with self._lock:
+            self._counts[counter] += 1
+
+    def get_or_scan(self, data, decode, scan):
+        """
+        Returns the cached Sudoku of the image or decodes and scans it
+        :param data: Raw bytes of the uploaded image
+        :param decode: Function decoding the bytes to a grayscale opencv-image
+        :param scan: Function scanning the opencv-image, returns a Sudoku
+        :return: Sudoku
+        """
+        raw_key = f'raw:{self._fingerprint}:{hashlib.sha256(data).hexdigest()}'
+        entry = self._backend.get(raw_key)
+        if entry is not None:
+            log.debug('Found image in scan cache')
+            self._count('raw_hits')
+            return Sudoku.from_flat_array(np.array(entry['sudoku']))
+
+        image = decode(data)
+        image_hash = None
+        if self._perceptual_hash:
+            image_hash = self.dhash(image)
+            similar_hash = image_hash
+            if self._max_distance > 0:
+                similar_hash = self._find_similar(image_hash)
+            entry = self._backend.get(self._hash_key(similar_hash)) if similar_hash is not None else None
+            if entry is not None:
+                log.debug('Found similar image in scan cache')
+                self._count('perceptual_hits')
+                self._store(raw_key, image_hash, entry)
+                return Sudoku.from_flat_array(np.array(entry['sudoku']))
+
+        self._count('misses')
+        sudoku = scan(image)
+        self._store(raw_key, image_hash, {'sudoku': sudoku.flatten().tolist()})
+        return sudoku
+
+    def _hash_key(self, image_hash):
+        return f'dhash:{self._fingerprint}:{image_hash:016x}'
+
+    def _store(self, raw_key, image_hash, entry):
+        """
+        Stores the entry under the keys of the scanned image, never under the keys of a similar image
+        :param image_hash: dHash of the scanned image, None if perceptual hashing is disabled
+        """
+        self._backend.put(raw_key, entry)
+        if image_hash is not None:
+            self._backend.put(self._hash_key(image_hash), entry)
+            if self._max_distance > 0:
+                self._remember_hash(image_hash)
+
+    def statistics(self):
+        statistics = self._backend.statistics()
+        with self._lock:
+            hits = self._counts['raw_hits'] + self._counts['perceptual_hits']
+            requests = hits + self._counts['misses']
+            statistics.update(self._counts)
+            statistics.update({
+                'hits': hits,
+                'hit_ratio': hits / requests if requests else 0.0,
+            })
+        return statistics
@@ -0,0 +1,90 @@
+import hashlib
+import logging
+from time import monotonic
+
+import numpy as np
+
+from api.caches import CacheBackend
+from puzzle_solver.models.grid_games import Sudoku, SudokuTransformation
+from puzzle_solver.solver import SolverResult
+from puzzle_solver.solver.SolverResult import STATUS_OPTIMAL, STATUS_FEASIBLE, STATUS_INFEASIBLE
+
+log = logging.getLogger(__name__)
+
+SECTION = 'cache'
+
+
+class SolutionCache:
+    """
+    Caches the results of the solver keyed by a hash of the given numbers.
+    Optionally the Sudoku is canonicalized first, so equivalent Sudokus (transposed, permuted, relabeled)
+    share one entry and the cached solutions are mapped back to the requested Sudoku.
+    """
+
+    def __init__(self, backend: CacheBackend, canonicalize=True):
+        self._backend = backend
+        self._canonicalize = canonicalize
+
+    @staticmethod
+    def from_config(config):
+        """
+        :return: SolutionCache or None if disabled in the [cache] section
+        """
+        backend = CacheBackend.from_config(config, SECTION, table='solutions')
+        if backend is None:
+            return None
+        return SolutionCache(backend, config.getboolean(SECTION, 'canonicalize', fallback=True))
+
+    def _transform(self, sudoku):
+        if self._canonicalize:
+            return SudokuTransformation.canonicalize(sudoku.initial_game(), sudoku.get_cell_size())
+        return np.asarray(sudoku.initial_game()), SudokuTransformation.identity(sudoku.get_height())
+
+    @staticmethod
+    def _key(board, max_solutions):
+        digest = hashlib.sha256(np.ascontiguousarray(board, dtype=np.int16).tobytes()).hexdigest()
+        return f'{len(board)}:{max_solutions}:{digest}'
+
+    @staticmethod
+    def is_cacheable(result, max_solutions):
+        """
+        Only results which do not depend on the time limit are cached
+        """
+        if result.status in [STATUS_OPTIMAL, STATUS_INFEASIBLE]:
+            return True
+        return result.status == STATUS_FEASIBLE and max_solutions is not None \
+            and result.solution_count >= max_solutions
+
+    def get_or_solve(self, sudoku, max_solutions, solve):
+        """
+        Returns the cached result for the Sudoku or solves and caches it
+        :param sudoku: Sudoku to solve
+        :param max_solutions: Maximum number of solutions as passed to the solver, part of the key
+        :param solve: Function solving the Sudoku, returns a SolverResult
+        :return: SolverResult
+        """
+        start = monotonic()
+        board, transformation = self._transform(sudoku)
+        key = self._key(board, max_solutions)
+
+        entry = self._backend.get(key)
+        if entry is not None:
+            log.debug(f'Found solution in cache ({key})')
+            solutions = []
+            for grid in entry['solutions']:
+                solution = Sudoku(sudoku.initial_game())
+                solution.game = transformation.invert(np.array(grid))
+                solutions.append(solution)
+            return SolverResult(tuple(solutions), entry['status'], entry['truncated'], monotonic() - start)
+
+        result = solve(sudoku)
+        if self.is_cacheable(result, max_solutions):
+            self._backend.put(key, {
+                'status': result.status,
+                'truncated': result.truncated,
+                'solutions': [transformation.apply(solution.game).tolist() for solution in result.solutions],
+            })
+        return result
+
+    def statistics(self):
+        return self._backend.statistics()
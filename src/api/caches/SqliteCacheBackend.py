@@ -0,0 +1,50 @@
+import json
+import sqlite3
+from time import time
+
+from api.caches import CacheBackend
+
+
+class SqliteCacheBackend(CacheBackend):
+    """
+    LRU cache stored in a sqlite database, survives restarts and can be shared by processes
+    """
+
+    def __init__(self, path, max_entries, ttl=None, table='cache'):
+        super().__init__(max_entries, ttl)
+        self._table = table
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(f'CREATE TABLE IF NOT EXISTS {table} ('
+                                     'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, accessed_at REAL)')
+            self._connection.execute(f'CREATE INDEX IF NOT EXISTS {table}_accessed_at ON {table} (accessed_at)')
+
+    def _get(self, key):
+        row = self._connection.execute(f'SELECT value, expires_at FROM {self._table} WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+
+        value, expires_at = row
+        now = time()
+        with self._connection:
+            if expires_at is not None and expires_at < now:
+                self._connection.execute(f'DELETE FROM {self._table} WHERE key = ?', (key,))
+                self._evictions += 1
+                return None
+            self._connection.execute(f'UPDATE {self._table} SET accessed_at = ? WHERE key = ?', (now, key))
+        return json.loads(value)
+
+    def _put(self, key, value):
+        now = time()
+        expires_at = now + self._ttl if self._ttl else None
+        with self._connection:
+            self._connection.execute(f'INSERT OR REPLACE INTO {self._table} VALUES (?, ?, ?, ?)',
+                                     (key, json.dumps(value), expires_at, now))
+            overflow = self.size() - self._max_entries
+            if overflow > 0:
+                self._connection.execute(f'DELETE FROM {self._table} WHERE key IN ('
+                                         f'SELECT key FROM {self._table} ORDER BY accessed_at LIMIT ?)', (overflow,))
+                self._evictions += overflow
+
+    def size(self):
+        return self._connection.execute(f'SELECT COUNT(*) FROM {self._table}').fetchone()[0]
@@ -0,0 +1,5 @@
+from .CacheBackend import CacheBackend
+from .MemoryCacheBackend import MemoryCacheBackend
+from .SqliteCacheBackend import SqliteCacheBackend
+from .SolutionCache import SolutionCache
+from .ScanCache import ScanCache
@@ -1,13 +1,92 @@
+import json
 import logging
+from time import perf_counter
 
-from flask import request, Blueprint, send_file
+from flask import request, Blueprint, jsonify, Response, g, url_for
 
-from api.mappers import ImageMapper, SudokuMapper
-from api.services import SudokuService
+from api.mappers import SudokuMapper, ImageTooLargeError
+from api.services import SudokuService, JobService
+from api.workers import PoolFullError, JobTimeoutError
+from puzzle_solver import metrics
 
 log = logging.getLogger(__name__)
 grid_game_controller = Blueprint('api_controller', __name__, template_folder='templates')
 sudoku_service = SudokuService()
+job_service = JobService(sudoku_service)
+
+FORMAT_JSON = 'json'
+FORMAT_ZIP = 'zip'
+FORMATS = [FORMAT_JSON, FORMAT_ZIP]
+MIMETYPES = {'application/json': FORMAT_JSON, 'application/zip': FORMAT_ZIP}
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+requests_total = metrics.registry.counter('puzzle_solver_requests_total', 'Number of requests by endpoint and status',
+                                          ['endpoint', 'status'])
+request_seconds = metrics.registry.histogram('puzzle_solver_request_seconds',
+                                             'Duration of the requests by endpoint in seconds', ['endpoint'])
+
+
+@grid_game_controller.before_request
+def start_request_timer():
+    g.request_start = perf_counter()
+
+
+@grid_game_controller.after_request
+def record_request_metrics(response):
+    # Streamed responses are only timed until the first byte is ready
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unknown'
+    requests_total.inc(endpoint=endpoint, status=response.status_code)
+    request_seconds.observe(perf_counter() - g.request_start, endpoint=endpoint)
+    return response
+
+
+@grid_game_controller.errorhandler(ValueError)
+def handle_value_error(error):
+    log.warning(f'Invalid request: {error}')
+    return str(error), 400
+
+
+@grid_game_controller.errorhandler(ImageTooLargeError)
+def handle_image_too_large_error(error):
+    log.warning(f'Rejected image: {error}')
+    return str(error), 413
+
+
+@grid_game_controller.errorhandler(PoolFullError)
+def handle_pool_full_error(error):
+    log.warning('Rejected request, all workers are busy')
+    return str(error), 503, {'Retry-After': str(error.retry_after)}
+
+
+@grid_game_controller.errorhandler(JobTimeoutError)
+def handle_job_timeout_error(error):
+    log.warning(str(error))
+    return str(error), 504
+
+
+def get_response_format(options):
+    """
+    Reads the requested format of the solutions, either from the 'format' option or the Accept header.
+    Defaults to JSON, images of the solutions are only rendered on request.
+    """
+    response_format = options.get('format')
+    if response_format is None:
+        mimetype = request.accept_mimetypes.best_match(list(MIMETYPES.keys()), default='application/json')
+        response_format = MIMETYPES[mimetype]
+    if response_format not in FORMATS:
+        raise ValueError(f'Unknown format {response_format}. Expected one of {FORMATS}')
+    return response_format
+
+
+def send_solutions(result, response_format):
+    if response_format == FORMAT_ZIP:
+        response = Response(sudoku_service.render_solutions(result), mimetype='application/zip',
+                            headers={'Content-Disposition': 'attachment; filename=solved_sudoku.zip'})
+    else:
+        response = jsonify(SudokuMapper.to_json(result))
+    response.headers['X-Solution-Count'] = str(result.solution_count)
+    response.headers['X-Solutions-Truncated'] = str(result.truncated).lower()
+    return response
 
 
 @grid_game_controller.route('/', methods=['POST'])
@@ -20,22 +99,73 @@ def solve_sudoku():
     log.info('Received Sudoku to solve')
     data = request.json
     sudoku = SudokuMapper.from_json(data)
-    solutions = sudoku_service.solve_sudoku(sudoku)
+    max_solutions = SudokuMapper.max_solutions_from_json(data)
+    profile = SudokuMapper.profile_from_json(data)
+    response_format = get_response_format(data)
+    result = sudoku_service.solve_sudoku(sudoku, max_solutions, profile)
     log.info('Finished solving Sudoku')
-    zip_io = ImageMapper.from_images([solution.to_image() for solution in solutions])
-    return send_file(zip_io,
-                     as_attachment=True,
-                     attachment_filename='solved_sudoku.zip')
+    return send_solutions(result, response_format)
 
 
 @grid_game_controller.route('/sudoku/image', methods=['POST'])
 def solve_sudoku_by_image():
     log.info('Received image of Sudoku to solve')
-    file = request.files['image']
-    image = ImageMapper.from_api(file)
-    solutions = sudoku_service.solve_sudoku_by_image(image)
+    data = request.files['image'].read()
+    max_solutions = SudokuMapper.max_solutions_from_json(request.values)
+    profile = SudokuMapper.profile_from_json(request.values)
+    response_format = get_response_format(request.values)
+    result = sudoku_service.solve_sudoku_by_image(data, max_solutions, profile)
     log.info('Finished solving Sudoku')
-    zip_io = ImageMapper.from_images([solution.to_image() for solution in solutions])
-    return send_file(zip_io,
-                     as_attachment=True,
-                     attachment_filename='solved_sudoku.zip')
+    return send_solutions(result, response_format)
+
+
+@grid_game_controller.route('/sudoku/batch', methods=['POST'])
+def solve_sudoku_batch():
+    items, options = SudokuMapper.batch_from_request(request)
+    max_solutions = SudokuMapper.max_solutions_from_json(options)
+    profile = SudokuMapper.profile_from_json(options)
+    log.info(f'Received batch of {len(items)} Sudokus to solve')
+    results = sudoku_service.solve_sudokus(items, max_solutions, profile)
+    return Response((json.dumps(result) + '\n' for result in results), mimetype='application/x-ndjson')
+
+
+@grid_game_controller.route('/jobs', methods=['POST'])
+def create_job():
+    if not job_service.is_enabled():
+        return 'Jobs are disabled', 404
+    if 'image' in request.files:
+        options = request.values
+        max_solutions = SudokuMapper.max_solutions_from_json(options)
+        profile = SudokuMapper.profile_from_json(options)
+        job = job_service.submit_image(request.files['image'].read(), max_solutions, profile)
+    else:
+        options = request.json
+        sudoku = SudokuMapper.from_json(options)
+        max_solutions = SudokuMapper.max_solutions_from_json(options)
+        profile = SudokuMapper.profile_from_json(options)
+        job = job_service.submit_sudoku(sudoku, max_solutions, profile)
+    log.info(f'Queued job {job["id"]}')
+    return jsonify(job), 202, {'Location': url_for('.get_job', job_id=job['id'])}
+
+
+@grid_game_controller.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_service.get_job(job_id) if job_service.is_enabled() else None
+    if job is None:
+        return f'Unknown job {job_id}', 404
+    return jsonify(job)
+
+
+@grid_game_controller.route('/cache', methods=['GET'])
+def get_cache_statistics():
+    return jsonify(sudoku_service.cache_statistics())
+
+
+@grid_game_controller.route('/workers', methods=['GET'])
+def get_worker_statistics():
+    return jsonify(sudoku_service.worker_statistics())
+
+
+@grid_game_controller.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.registry.render(), content_type=METRICS_CONTENT_TYPE)
@@ -0,0 +1,73 @@
+import logging
+import uuid
+from time import time
+
+from api.caches import CacheBackend
+
+log = logging.getLogger(__name__)
+
+SECTION = 'jobs'
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+FINAL_STATUSES = [STATUS_DONE, STATUS_FAILED]
+
+
+class JobStore:
+    """
+    Keeps the state and results of asynchronous jobs in a cache backend, jobs expire after the TTL of the backend.
+    Jobs are plain dictionaries with the keys id, status, created_at, updated_at and optionally result or error.
+    """
+
+    def __init__(self, backend: CacheBackend):
+        self._backend = backend
+        # Jobs which are not finished and were started by another instance were interrupted by a restart
+        self._instance = uuid.uuid4().hex
+
+    @staticmethod
+    def from_config(config):
+        """
+        Reads the [jobs] section, the jobs are kept in memory for an hour by default
+        :return: JobStore or None if jobs are disabled
+        """
+        backend = CacheBackend.from_config(config, SECTION, table=SECTION, enabled=True, ttl=3600)
+        if backend is None:
+            return None
+        return JobStore(backend)
+
+    def create(self):
+        """
+        :return: New queued job
+        """
+        now = time()
+        job = {'id': uuid.uuid4().hex, 'status': STATUS_QUEUED, 'created_at': now, 'updated_at': now}
+        self._backend.put(job['id'], {**job, 'instance': self._instance})
+        return job
+
+    def update(self, job_id, **fields):
+        job = self._backend.get(job_id)
+        if job is None:
+            log.warning(f'Job {job_id} expired before it was finished')
+            return
+        # The memory backend returns the stored dictionary itself, it must not be changed in place
+        job = dict(job)
+        job.update(fields, updated_at=time())
+        self._backend.put(job_id, job)
+
+    def get(self, job_id):
+        """
+        :return: Job or None if it does not exist or has expired
+        """
+        job = self._backend.get(job_id)
+        if job is None:
+            return None
+        job = dict(job)
+        instance = job.pop('instance', None)
+        if job['status'] not in FINAL_STATUSES and instance != self._instance:
+            job.update(status=STATUS_FAILED, error='Job was interrupted by a restart of the server')
+        return job
+
+    def statistics(self):
+        return self._backend.statistics()
@@ -0,0 +1 @@
+from .JobStore import JobStore
@@ -1,9 +1,45 @@
+from collections import deque
 from io import BytesIO
-from zipfile import ZipFile
+from zipfile import ZipFile, ZIP_STORED
 
 import cv2
 import numpy as np
-from PIL import Image
+from PIL import Image, UnidentifiedImageError
+
+# Decoding flags by reduction factor, JPEGs are scaled down while decoding
+REDUCED_GRAYSCALE = {1: cv2.IMREAD_GRAYSCALE, 2: cv2.IMREAD_REDUCED_GRAYSCALE_2, 4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+                     8: cv2.IMREAD_REDUCED_GRAYSCALE_8}
+
+
+class ImageTooLargeError(ValueError):
+    """
+    Raised if an uploaded image has more pixels than allowed
+    """
+
+
+class _ZipStream:
+    """
+    Write-only file collecting the output of a ZipFile until it is sent. As it has no tell(), ZipFile treats it as
+    unseekable and writes the size of each file after its data instead of seeking back to the header.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        """
+        :return: Bytes written since the last call
+        """
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
 
 
 class ImageMapper:
@@ -15,10 +51,44 @@ class ImageMapper:
         :param file: File as Buffer
         :return: opencv-image (Numpy Array)
         """
-        image = Image.open(file.stream)
-        image = np.array(image)
-        image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-        return image
+        return ImageMapper.from_bytes(file.read())
+
+    @staticmethod
+    def get_reduction(width, height, min_size=None):
+        """
+        :param min_size: Minimum width or height of the decoded image, None to decode in full resolution
+        :return: Largest supported reduction factor which keeps the larger side of the image at least min_size
+        """
+        if not min_size:
+            return 1
+        return max(factor for factor in REDUCED_GRAYSCALE if factor == 1 or max(width, height) // factor >= min_size)
+
+    @staticmethod
+    def from_bytes(data, max_pixels=None, min_size=None):
+        """
+        Maps the raw bytes of an uploaded image to a grayscale opencv-Image.
+        The size is read from the header first, so oversized images are rejected before decoding them.
+        :param data: Content of the image file
+        :param max_pixels: Maximum number of pixels of the image, None for no limit
+        :param min_size: Decode the image at a reduced size, as long as its larger side keeps at least min_size pixels
+        :return: opencv-image (Numpy Array)
+        """
+        try:
+            image = Image.open(BytesIO(data))
+        except UnidentifiedImageError:
+            raise ValueError('Unsupported image format')
+        except Image.DecompressionBombError as e:
+            # Pillow refuses images far above its own limit before our limit is checked
+            raise ImageTooLargeError(str(e))
+        width, height = image.size
+        if max_pixels and width * height > max_pixels:
+            raise ImageTooLargeError(f'Image has {width}x{height} pixels, at most {max_pixels} pixels are allowed')
+
+        flag = REDUCED_GRAYSCALE[ImageMapper.get_reduction(width, height, min_size)]
+        decoded = cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+        if decoded is None:  # Formats opencv cannot read, e.g. GIF
+            decoded = np.asarray(image.convert('L'))
+        return decoded
 
     @staticmethod
     def from_image(image):
@@ -31,16 +101,55 @@ class ImageMapper:
         return BytesIO(buffer)
 
     @staticmethod
-    def from_images(images):
-        """
-        Maps multiple opencv-images to zip file as buffer
-        :param images: list of opencv-images
-        :return: Zip file as buffer
-        """
-        stream = BytesIO()
-        with ZipFile(stream, 'w') as zf:
-            for i, image in enumerate(images):
-                is_success, buffer = cv2.imencode(".png", image)
-                zf.writestr(f'sudoku_solution_{i}.png', buffer)
-        stream.seek(0)
-        return stream
+    def to_png(image):
+        """
+        Encodes an opencv-image as PNG. Releases the GIL while encoding, so images can be encoded in threads.
+        :return: PNG file as bytes
+        """
+        is_success, buffer = cv2.imencode(".png", image)
+        return buffer.tobytes()
+
+    @staticmethod
+    def encode_ahead(images, executor=None, window=1):
+        """
+        Encodes the images as PNG in the executor, keeping at most window images in flight
+        :param images: Iterable of opencv-images, only read as far as needed
+        :param executor: concurrent.futures.Executor, the images are encoded in the calling thread if None
+        :return: Generator of the PNG files as bytes, in the order of the images
+        """
+        if executor is None:
+            yield from map(ImageMapper.to_png, images)
+            return
+        futures = deque()
+        try:
+            for image in images:
+                futures.append(executor.submit(ImageMapper.to_png, image))
+                if len(futures) >= window:
+                    yield futures.popleft().result()
+            while futures:
+                yield futures.popleft().result()
+        finally:
+            # The client went away, drop the images which have not been encoded yet
+            for future in futures:
+                future.cancel()
+
+    @staticmethod
+    def from_images(images, executor=None, window=1):
+        """
+        Maps multiple opencv-images to a zip file, which is streamed while the images are encoded.
+        The PNGs are stored without compression as they are compressed already.
+        :param images: Iterable of opencv-images, only read as far as needed
+        :param executor: concurrent.futures.Executor encoding the images, see encode_ahead
+        :param window: Number of images encoded ahead of the stream, bounds the memory used by the stream
+        :return: Generator of the bytes of the zip file
+        """
+        stream = _ZipStream()
+        pngs = ImageMapper.encode_ahead(images, executor, window)
+        try:
+            with ZipFile(stream, 'w', ZIP_STORED) as zf:
+                for i, png in enumerate(pngs):
+                    zf.writestr(f'sudoku_solution_{i}.png', png)
+                    yield stream.pop()
+            yield stream.pop()  # Central directory
+        finally:
+            pngs.close()
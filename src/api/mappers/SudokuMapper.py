@@ -1,3 +1,5 @@
+import json
+
 import numpy as np
 
 from puzzle_solver.models.grid_games import Sudoku
@@ -18,4 +20,85 @@ class SudokuMapper:
         else:
             raise ValueError('Unknown format used to transmit sudoku. Expected 1D or 2D like array.')
 
+        size = sudoku.get_height()
+        if not np.issubdtype(sudoku.game.dtype, np.integer):
+            raise ValueError(f'Fields of the sudoku have to be integers between 0 and {size}.')
+        invalid = sudoku.game[(sudoku.game < 0) | (sudoku.game > size)]
+        if len(invalid) > 0:
+            raise ValueError(f'Fields of the sudoku have to be between 0 (empty) and {size}. '
+                             f'Got {", ".join(map(str, np.unique(invalid)))} instead.')
+
         return sudoku
+
+    @staticmethod
+    def to_json(result):
+        """
+        Maps a SolverResult to a JSON serializable dictionary, solutions are given as 2D arrays
+        """
+        return {
+            'status': result.status,
+            'truncated': result.truncated,
+            'solution_count': result.solution_count,
+            'solutions': [solution.game.tolist() for solution in result.solutions],
+        }
+
+    @staticmethod
+    def batch_from_request(request):
+        """
+        Reads the Sudokus of a batch request. Accepts NDJSON (one Sudoku per line) or JSON,
+        either an array of Sudokus or an object with the array as 'sudokus'.
+        Each Sudoku is either given as array or as object like in single requests.
+        :return: List of dictionaries as accepted by from_json and the options of the batch
+        """
+        if request.mimetype in ['application/x-ndjson', 'application/jsonl']:
+            lines = request.get_data(as_text=True).splitlines()
+            items = [json.loads(line) for line in lines if line.strip()]
+            options = request.args
+        else:
+            data = request.get_json()
+            if isinstance(data, dict):
+                items = data.get('sudokus')
+                options = data
+            else:
+                items = data
+                options = request.args
+
+        if not isinstance(items, list):
+            raise ValueError('Expected an array of Sudokus.')
+        return [item if isinstance(item, dict) else {'sudoku': item} for item in items], options
+
+    @staticmethod
+    def max_solutions_from_json(data):
+        """
+        Reads the maximum number of solutions to search for.
+        Either given directly as 'max_solutions' or using 'unique', which only searches whether there is a second
+        solution.
+        :return: Maximum number of solutions or None if not limited by the request
+        """
+        unique = data.get('unique', False)
+        if isinstance(unique, str):
+            unique = unique.lower() in ['1', 'true', 'yes']
+        if unique:
+            return 2
+
+        max_solutions = data.get('max_solutions')
+        if max_solutions is None:
+            return None
+        try:
+            max_solutions = int(max_solutions)
+        except (TypeError, ValueError):
+            raise ValueError(f'max_solutions has to be a positive integer. Got {max_solutions!r} instead.')
+        if max_solutions < 1:
+            raise ValueError(f'max_solutions has to be a positive integer. Got {max_solutions} instead.')
+        return max_solutions
+
+    @staticmethod
+    def profile_from_json(data):
+        """
+        Reads the name of the solver profile to use
+        :return: Name of the profile or None to use the default profile
+        """
+        profile = data.get('profile')
+        if profile is not None and not isinstance(profile, str):
+            raise ValueError(f'profile has to be the name of a solver profile. Got {profile!r} instead.')
+        return profile or None
@@ -1,2 +1,2 @@
-from .ImageMapper import ImageMapper
+from .ImageMapper import ImageMapper, ImageTooLargeError
 from .SudokuMapper import SudokuMapper
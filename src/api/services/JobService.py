@@ -0,0 +1,72 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from api.jobs import JobStore
+from api.jobs.JobStore import STATUS_RUNNING, STATUS_DONE, STATUS_FAILED
+from api.mappers import SudokuMapper
+from api.workers import PoolFullError
+from puzzle_solver.settings import get_settings
+
+log = logging.getLogger(__name__)
+
+
+class JobService:
+    """
+    Runs scans and solves in background threads, clients poll the job for the result
+    """
+
+    def __init__(self, sudoku_service):
+        self._config = get_settings()
+        self._sudoku_service = sudoku_service
+        self._store = JobStore.from_config(self._config)
+        threads = self._config.getint('jobs', 'threads', fallback=2)
+        self._executor = ThreadPoolExecutor(threads, thread_name_prefix='job')
+        self._pending = threading.BoundedSemaphore(self._config.getint('jobs', 'max_pending', fallback=100))
+        self._retry_after = self._config.getint('jobs', 'retry_after', fallback=1)
+
+    def is_enabled(self):
+        return self._store is not None
+
+    def _submit(self, function, *args):
+        if not self._pending.acquire(blocking=False):
+            raise PoolFullError(self._retry_after)
+        job = self._store.create()
+        try:
+            self._executor.submit(self._run, job['id'], function, *args)
+        except BaseException:
+            self._pending.release()
+            raise
+        return job
+
+    def _run(self, job_id, function, *args):
+        try:
+            self._store.update(job_id, status=STATUS_RUNNING)
+            result = function(*args)
+            self._store.update(job_id, status=STATUS_DONE, result=SudokuMapper.to_json(result))
+        except Exception as e:
+            log.exception(f'Job {job_id} failed')
+            self._store.update(job_id, status=STATUS_FAILED, error=str(e))
+        finally:
+            self._pending.release()
+
+    def submit_sudoku(self, sudoku, max_solutions=None, profile=None):
+        """
+        :return: Queued job
+        """
+        self._sudoku_service.check_profile(profile)
+        return self._submit(self._sudoku_service.solve_sudoku, sudoku, max_solutions, profile)
+
+    def submit_image(self, data, max_solutions=None, profile=None):
+        """
+        :param data: Raw bytes of the uploaded image
+        :return: Queued job
+        """
+        self._sudoku_service.check_profile(profile)
+        return self._submit(self._sudoku_service.solve_sudoku_by_image, data, max_solutions, profile)
+
+    def get_job(self, job_id):
+        """
+        :return: Job or None if it does not exist or has expired
+        """
+        return self._store.get(job_id)
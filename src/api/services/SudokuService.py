@@ -1,32 +1,293 @@
 import logging
-from time import time
+import os
+from collections import deque
+from math import isqrt
+from concurrent.futures import ThreadPoolExecutor
+from time import time, perf_counter
 
+import cv2
+import numpy as np
+
+from api.caches import SolutionCache, ScanCache
+from api.mappers import ImageMapper, SudokuMapper
+from api.workers import WorkerPool
+from puzzle_solver.models.grid_games import Sudoku
+from puzzle_solver.models.grid_games.Sudoku import SUPPORTED_CELL_SIZES
+from puzzle_solver.metrics import stage_seconds
 from puzzle_solver.scanners import SudokuScanner
+from puzzle_solver.scanners.SudokuScanner import DEFAULT_BOARD_SIZE
+from puzzle_solver.settings import get_settings
 from puzzle_solver.solver import SudokuSolver
+from puzzle_solver.solver.SudokuSolver import get_structural_model
 
 log = logging.getLogger(__name__)
 
+DEFAULT_MAX_PIXELS = 50_000_000
+DEFAULT_RENDER_THREADS = min(4, os.cpu_count() or 1)
+# Seconds left to a solve in a worker for returning its result before the request times out
+WORKER_TIMEOUT_MARGIN = 0.5
+MIN_TIME_LIMIT = 0.01
+
+# Size of the tiles and the white margin around the board of the synthetic warm-up image in pixels
+WARMUP_TILE_SIZE = 50
+WARMUP_MARGIN = 30
+
+_worker_solver = None
+_worker_scanner = None
+
+
+def _init_worker():
+    """
+    Runs once per worker process, the solver and scanner are reused for all jobs of this process
+    """
+    global _worker_solver, _worker_scanner
+    _worker_solver = SudokuSolver()
+    _worker_scanner = SudokuScanner()
+    for cell_size in SUPPORTED_CELL_SIZES:
+        get_structural_model(cell_size)
+
+
+def _solve_job(sudoku, max_solutions, profile, time_limit, deadline=None):
+    """
+    :param deadline: Time (as returned by time()) the solver has to stop at, however long the job waited for a worker
+    """
+    if deadline is not None:
+        remaining = max(deadline - time(), MIN_TIME_LIMIT)
+        time_limit = min(time_limit or remaining, remaining)
+    return _worker_solver.solve(sudoku, max_solutions, profile, time_limit)
+
+
+def _scan_job(image):
+    return _worker_scanner.scan_with_statistics(image)
+
+
+def create_warmup_solution(board_size):
+    """
+    :return: Solved board of the size as 2D numpy array, the rows are shifted copies of each other
+    """
+    cell_size = isqrt(board_size)
+    i, j = np.indices((board_size, board_size))
+    return (cell_size * (i % cell_size) + i // cell_size + j) % board_size + 1
+
+
+def draw_sudoku(sudoku, tile_size=WARMUP_TILE_SIZE, margin=WARMUP_MARGIN):
+    """
+    Draws the given numbers of the Sudoku onto a printed looking board, the boxes are separated by thick lines
+    :return: Grayscale opencv-image (Numpy Array)
+    """
+    board_size = sudoku.get_height()
+    cell_size = sudoku.get_cell_size()
+    end = margin + board_size * tile_size
+    image = np.full((end + margin, end + margin), 255, np.uint8)
+    for k in range(board_size + 1):
+        thickness = 3 if k % cell_size == 0 else 1
+        position = margin + k * tile_size
+        cv2.line(image, (margin, position), (end, position), 0, thickness)
+        cv2.line(image, (position, margin), (position, end), 0, thickness)
+    for i, j in zip(*sudoku.game.nonzero()):
+        text = str(sudoku.game[i, j])
+        scale = tile_size / (40 if len(text) == 1 else 60)
+        origin = (margin + j * tile_size + tile_size // (4 * len(text)), margin + (i + 1) * tile_size - tile_size // 5)
+        cv2.putText(image, text, origin, cv2.FONT_HERSHEY_SIMPLEX, scale, 0, 2)
+    return image
+
+
+def _solve_batch_item(item, max_solutions, profile):
+    """
+    Solves a single Sudoku of a batch inside a worker process
+    :param item: Sudoku as sent by the client, see SudokuMapper.from_json
+    :return: JSON serializable result, errors are reported per Sudoku
+    """
+    start = perf_counter()
+    try:
+        sudoku = SudokuMapper.from_json(item)
+        result = SudokuMapper.to_json(_worker_solver.solve(sudoku,
+                                                           SudokuMapper.max_solutions_from_json(item) or max_solutions,
+                                                           SudokuMapper.profile_from_json(item) or profile))
+    except Exception as e:
+        result = {'status': 'ERROR', 'error': str(e)}
+    result['time_ms'] = round((perf_counter() - start) * 1000, 3)
+    return result
+
+
+def _solve_batch_chunk(items, max_solutions, profile):
+    return [_solve_batch_item(item, max_solutions, profile) for item in items]
+
 
 class SudokuService:
 
     def __init__(self):
+        self._config = get_settings()
         self._scanner = SudokuScanner()
         self._solver = SudokuSolver()
+        self._solution_cache = SolutionCache.from_config(self._config)
+        self._scan_cache = ScanCache.from_config(self._config)
+        self._pool = WorkerPool.from_config(self._config, initializer=_init_worker)
+        self._offload = self._config.getboolean('workers', 'offload', fallback=False)
+        if self._offload:
+            self._pool.start()
+        # Threads are started on demand, opencv releases the GIL while encoding the PNGs
+        self._render_threads = self._config.getint('render', 'threads', fallback=DEFAULT_RENDER_THREADS)
+        if self._render_threads < 1:
+            raise ValueError(f'[render] threads has to be a positive integer. Got {self._render_threads} instead.')
+        self._encoder = ThreadPoolExecutor(self._render_threads, thread_name_prefix='png-encoder')
+
+    def _solve(self, sudoku, max_solutions, profile):
+        if not self._offload:
+            return self._solver.solve(sudoku, max_solutions, profile)
+        # Let the solver stop by itself before the job times out, so it returns the solutions found so far.
+        # The timeout of the pool only catches hung workers, running jobs cannot be interrupted otherwise.
+        time_limit = self._config.getfloat('solver', 'time_limit', fallback=0) or None
+        deadline = None
+        if self._pool.timeout:
+            deadline = time() + max(self._pool.timeout - WORKER_TIMEOUT_MARGIN, self._pool.timeout / 2)
+        return self._pool.run(_solve_job, sudoku, max_solutions, profile, time_limit, deadline)
+
+    def _scan(self, image):
+        if not self._offload:
+            return self._scanner.scan_with_statistics(image)
+        return self._pool.run(_scan_job, image)
 
-    def solve_sudoku(self, sudoku):
+    def check_profile(self, profile):
+        """
+        :raise ValueError: If there is no solver profile of this name
+        """
+        self._solver.get_profile(profile)
+
+    def solve_sudoku(self, sudoku, max_solutions=None, profile=None):
+        """
+        :param profile: Name of the solver profile, None for the default profile
+        :return: SolverResult
+        """
         log.debug('Solve Sudoku')
+        self.check_profile(profile)  # Reject unknown profiles even if the solution is cached
         start = time()
-        solutions = self._solver.solve(sudoku)
+        if self._solution_cache is not None:
+            result = self._solution_cache.get_or_solve(sudoku, max_solutions,
+                                                       lambda game: self._solve(game, max_solutions, profile))
+        else:
+            result = self._solve(sudoku, max_solutions, profile)
         end = time()
         log.debug(f'Took {round(end - start, 2)}s to solve the Sudoku')
 
-        return solutions
+        return result
 
-    def solve_sudoku_by_image(self, image):
+    def scan_sudoku(self, image):
         log.debug('Scan Sudoku')
         start = time()
-        sudoku = self._scanner.scan(image)
+        sudoku, statistics = self._scan(image)
         end = time()
         log.debug(f'Took {round(end - start, 2)}s to analyze the Image')
+        log.debug(f'Scan statistics: {statistics}')
+
+        return sudoku
+
+    def decode_image(self, data):
+        with stage_seconds.time(stage='decode'):
+            return ImageMapper.from_bytes(data,
+                                          self._config.getint('upload', 'max_pixels', fallback=DEFAULT_MAX_PIXELS),
+                                          self._config.getint('upload', 'decode_size', fallback=0) or None)
+
+    def solve_sudoku_by_image(self, data, max_solutions=None, profile=None):
+        """
+        :param data: Raw bytes of the uploaded image
+        :return: SolverResult
+        """
+        if self._scan_cache is not None:
+            sudoku = self._scan_cache.get_or_scan(data, self.decode_image, self.scan_sudoku)
+        else:
+            sudoku = self.scan_sudoku(self.decode_image(data))
+
+        return self.solve_sudoku(sudoku, max_solutions, profile)
+
+    def render_solutions(self, result):
+        """
+        Renders the solutions as PNG images into a zip file. The zip file is streamed while the solutions are rendered
+        and encoded, only a few images are held in memory at once.
+        :param result: SolverResult
+        :return: Generator of the bytes of the zip file
+        """
+        return self._stream_zip(self._render(solution) for solution in result.solutions)
+
+    @staticmethod
+    def _render(solution):
+        with stage_seconds.time(stage='render'):
+            return solution.to_image()
+
+    def _stream_zip(self, images):
+        start = perf_counter()
+        yield from ImageMapper.from_images(images, self._encoder, 2 * self._render_threads)
+        stage_seconds.observe(perf_counter() - start, stage='zip')
+
+    def solve_sudokus(self, items, max_solutions=None, profile=None):
+        """
+        Solves many Sudokus in parallel using the worker processes
+        :param items: Sudokus as sent by the client, see SudokuMapper.from_json
+        :param max_solutions: Default limit of solutions for Sudokus which do not define their own
+        :param profile: Default solver profile for Sudokus which do not define their own
+        :return: Generator of JSON serializable results in the order of the items
+        """
+        self.check_profile(profile)  # Fail before the response starts streaming
+        chunk_size = self._config.getint('batch', 'chunk_size', fallback=16)
+        chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+        return self._stream_batch(chunks, max_solutions, profile)
+
+    def _stream_batch(self, chunks, max_solutions, profile):
+        # Keep a few chunks per worker queued, waiting for free slots instead of rejecting parts of the batch
+        window = 2 * self._pool.statistics()['processes']
+        futures = deque()
+        index = 0
+        try:
+            for chunk in chunks:
+                futures.append(self._pool.submit(_solve_batch_chunk, chunk, max_solutions, profile, block=True))
+                while len(futures) >= window:
+                    for result in futures.popleft().result():
+                        yield {**result, 'index': index}
+                        index += 1
+            while futures:
+                for result in futures.popleft().result():
+                    yield {**result, 'index': index}
+                    index += 1
+        finally:
+            # The client went away, drop the chunks which have not been started yet
+            for future in futures:
+                future.cancel()
+
+    def warm_up(self):
+        """
+        Scans, solves and renders a synthetic Sudoku once, so the first request does not pay for importing the
+        backends, loading the OCR, building the solver model and rendering the board and numbers.
+        Bypasses the caches. Failures are logged, as they do not prevent the server from answering requests.
+        :return: Seconds taken
+        """
+        start = perf_counter()
+        board_size = self._config.getint('scanner', 'board_size', fallback=DEFAULT_BOARD_SIZE)
+        get_structural_model(isqrt(board_size))
+        solution = create_warmup_solution(board_size)
+        # Every third diagonal is given on the scanned board and open in the solved Sudoku, which keeps both fast
+        diagonals = np.add(*np.indices(solution.shape)) % 3 == 0
+        try:
+            self._scan(draw_sudoku(Sudoku(np.where(diagonals, solution, 0))))
+        except Exception as e:
+            log.warning(f'Warm-up scan failed: {e}')
+        try:
+            b''.join(self.render_solutions(self._solve(Sudoku(np.where(diagonals, 0, solution)), 1, None)))
+        except Exception as e:
+            log.warning(f'Warm-up solve failed: {e}')
+        seconds = perf_counter() - start
+        log.info(f'Warmed up in {round(seconds, 2)}s')
+        return seconds
+
+    def cache_statistics(self):
+        """
+        :return: Dictionary of statistics per enabled cache
+        """
+        statistics = {}
+        if self._solution_cache is not None:
+            statistics['solutions'] = self._solution_cache.statistics()
+        if self._scan_cache is not None:
+            statistics['scans'] = self._scan_cache.statistics()
+        return statistics
 
-        return self.solve_sudoku(sudoku)
+    def worker_statistics(self):
+        return self._pool.statistics()
@@ -1 +1,2 @@
 from .SudokuService import SudokuService
+from .JobService import JobService
@@ -0,0 +1,198 @@
+import logging
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError, wait
+
+from puzzle_solver import metrics
+
+log = logging.getLogger(__name__)
+
+jobs = metrics.registry.counter('puzzle_solver_worker_jobs_total', 'Number of jobs submitted to the worker pool',
+                                ['outcome'])
+
+
+class PoolFullError(Exception):
+    """
+    Raised if a job is submitted while all workers are busy and the queue is full
+    """
+
+    def __init__(self, retry_after):
+        super().__init__('All workers are busy, try again later')
+        self.retry_after = retry_after
+
+
+class JobTimeoutError(Exception):
+    """
+    Raised if a job did not finish within its timeout
+    """
+
+
+def _warm_up():
+    return os.getpid()
+
+
+def _init_worker(initializer):
+    # Forked workers inherit the metrics of the server, which must not be sent back to it
+    metrics.registry.drain()
+    if initializer is not None:
+        initializer()
+
+
+def _run_job(function, *args):
+    """
+    Runs in the worker process. If the job fails, its metrics are sent with the next job of the worker.
+    :return: Result of the job and the metrics recorded by the worker since its last job
+    """
+    result = function(*args)
+    return result, metrics.registry.drain()
+
+
+class _Job(Future):
+    """
+    Future of a job, which records the metrics of the worker in the server once the job is done
+    """
+
+    def __init__(self, future):
+        super().__init__()
+        self._future = future
+        self.timed_out = False
+        future.add_done_callback(self._finish)
+
+    def cancel(self):
+        # Cancelling the future of the executor cancels this one as well, see _finish
+        return self._future.cancel()
+
+    def _finish(self, future):
+        if future.cancelled():
+            super().cancel()
+            self.set_running_or_notify_cancel()
+            return
+        error = future.exception()
+        if error is not None:
+            self.set_exception(error)
+            return
+        result, samples = future.result()
+        metrics.registry.merge(samples)
+        self.set_result(result)
+
+
+class WorkerPool:
+    """
+    Bounded pool of worker processes. Expensive work (scanning, solving) runs in the workers,
+    so it neither blocks the GIL of the server nor starves its request threads.
+    At most processes + queue_size jobs are accepted at once, further jobs are rejected with PoolFullError.
+    """
+
+    def __init__(self, processes, queue_size, timeout=None, retry_after=1, initializer=None):
+        """
+        :param processes: Number of worker processes
+        :param queue_size: Number of jobs waiting for a free worker
+        :param timeout: Default time in seconds to wait for the result of a job, None to wait forever
+        :param retry_after: Seconds a client should wait before retrying a rejected job
+        :param initializer: Function called once in every worker process, e.g. to create solvers and scanners
+        """
+        self._processes = processes
+        self._queue_size = queue_size
+        self._timeout = timeout
+        self._retry_after = retry_after
+        self._initializer = initializer
+        self._slots = threading.BoundedSemaphore(processes + queue_size)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._in_flight = 0
+
+    @staticmethod
+    def from_config(config, initializer=None):
+        processes = config.getint('workers', 'processes', fallback=0) \
+            or config.getint('batch', 'workers', fallback=0) or os.cpu_count()
+        return WorkerPool(
+            processes,
+            config.getint('workers', 'queue_size', fallback=2 * processes),
+            config.getfloat('workers', 'timeout', fallback=0) or None,
+            config.getint('workers', 'retry_after', fallback=1),
+            initializer,
+        )
+
+    def start(self):
+        """
+        Starts the worker processes and waits until all of them are initialized. Called on the first job otherwise.
+        """
+        with self._lock:
+            if self._executor is not None:
+                return self._executor
+            log.info(f'Starting {self._processes} worker processes')
+            self._executor = ProcessPoolExecutor(self._processes, initializer=_init_worker,
+                                                 initargs=(self._initializer,))
+            wait([self._executor.submit(_warm_up) for _ in range(self._processes)])
+            return self._executor
+
+    def shutdown(self):
+        """
+        Cancels all waiting jobs and stops the workers once the running jobs are finished
+        """
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _release(self, future):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+        if future.timed_out:
+            jobs.inc(outcome='timeout')
+        elif future.cancelled():
+            jobs.inc(outcome='cancelled')
+        else:
+            jobs.inc(outcome='completed' if future.exception() is None else 'failed')
+
+    def submit(self, function, *args, block=False):
+        """
+        Queues a job. The returned future can be cancelled as long as the job has not been started.
+        The metrics recorded by the worker are added to the metrics of the server once the job is done.
+        :param function: Picklable function to run in a worker
+        :param block: Wait for a free slot instead of raising PoolFullError
+        :return: concurrent.futures.Future of the result
+        """
+        if not self._slots.acquire(blocking=block):
+            jobs.inc(outcome='rejected')
+            raise PoolFullError(self._retry_after)
+        try:
+            future = _Job(self.start().submit(_run_job, function, *args))
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._in_flight += 1
+        future.add_done_callback(self._release)
+        return future
+
+    def run(self, function, *args, timeout=None):
+        """
+        Runs a job and waits for its result. Jobs which are still waiting when the timeout expires are cancelled.
+        Running jobs cannot be interrupted, pass the timeout to the job itself, e.g. as time limit of the solver.
+        :param timeout: Seconds to wait for the result, defaults to the timeout of the pool
+        :return: Result of the job
+        """
+        timeout = timeout or self._timeout
+        future = self.submit(function, *args)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            # Counted once the job is done, which is immediately if it has not been started yet
+            future.timed_out = True
+            future.cancel()
+            raise JobTimeoutError(f'Job did not finish within {timeout}s')
+
+    @property
+    def timeout(self):
+        return self._timeout
+
+    def statistics(self):
+        with self._lock:
+            return {
+                'processes': self._processes,
+                'queue_size': self._queue_size,
+                'in_flight': self._in_flight,
+                'started': self._executor is not None,
+            }
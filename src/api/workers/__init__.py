@@ -0,0 +1 @@
+from .WorkerPool import WorkerPool, PoolFullError, JobTimeoutError
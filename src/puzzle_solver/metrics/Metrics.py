@@ -0,0 +1,183 @@
+import bisect
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 100, 1000, 10000, 100000, 1000000)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = [(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+               for name, value in pairs]
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}  # label values -> value
+
+    def _key(self, labels):
+        if set(labels.keys()) != set(self.label_names):
+            raise ValueError(f'{self.name} expects the labels {self.label_names}, got {tuple(labels.keys())}')
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def _merge(self, key, value):
+        raise NotImplementedError
+
+    def drain(self):
+        """
+        Removes all values, e.g. to send the values collected in a worker process to the server
+        :return: Values by label values
+        """
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values):
+        """
+        Adds values returned by drain of the same metric, e.g. in another process
+        """
+        with self._lock:
+            for key, value in values.items():
+                self._merge(key, value)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        with self._lock:
+            lines += [f'{name}{labels} {_format_value(value)}' for name, labels, value in self._samples()]
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _merge(self, key, value):
+        self._values[key] = self._values.get(key, 0) + value
+
+    def _samples(self):
+        for key, value in sorted(self._values.items()):
+            yield self.name, _format_labels(self.label_names, key), value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def _merge(self, key, value):
+        counts, total = value
+        if key in self._values:
+            current_counts, current_total = self._values[key]
+            counts, total = [a + b for a, b in zip(current_counts, counts)], current_total + total
+        self._values[key] = (list(counts), total)
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observes the duration of the block in seconds
+        """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start, **labels)
+
+    def _samples(self):
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield f'{self.name}_bucket', _format_labels(self.label_names, key, ('le', _format_value(bound))), \
+                    cumulative
+            yield f'{self.name}_sum', _format_labels(self.label_names, key), total
+            yield f'{self.name}_count', _format_labels(self.label_names, key), cumulative
+
+
+class MetricsRegistry:
+    """
+    Collection of all metrics of the process, rendered in the Prometheus text format
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _get_or_create(self, metric_type, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = metric_type(name, *args, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, metric_type):
+                raise ValueError(f'{name} is already registered as {metric.type}')
+            return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._get_or_create(Counter, name, documentation, labels)
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labels, buckets)
+
+    def drain(self):
+        """
+        Removes the values of all metrics
+        :return: Values by metric name and label values, only metrics with values are included
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        drained = {metric.name: metric.drain() for metric in metrics}
+        return {name: values for name, values in drained.items() if values}
+
+    def merge(self, samples):
+        """
+        Adds values returned by drain of another registry. Metrics which are not registered here are ignored.
+        """
+        for name, values in samples.items():
+            with self._lock:
+                metric = self._metrics.get(name)
+            if metric is not None:
+                metric.merge(values)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
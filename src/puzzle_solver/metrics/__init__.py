@@ -0,0 +1,7 @@
+from .Metrics import Counter, Histogram, MetricsRegistry, LATENCY_BUCKETS, COUNT_BUCKETS
+
+registry = MetricsRegistry()
+
+# Shared by all stages of the pipeline, from scanning to rendering the response
+stage_seconds = registry.histogram('puzzle_solver_stage_seconds', 'Duration of the stages of the pipeline in seconds',
+                                   ['stage'])
@@ -1,82 +1,166 @@
+import math
+from functools import lru_cache
+
 import cv2
 import numpy as np
 
 from puzzle_solver.models.grid_games import GridGame
 
-SUPPORTED_GAME_SIZE = 81
-SUPPORTED_CELL_SIZE = 3
+# Boards of n²xn² fields with boxes of nxn fields
+SUPPORTED_CELL_SIZES = [3, 4, 5]
+SUPPORTED_BOARD_SIZES = [cell_size * cell_size for cell_size in SUPPORTED_CELL_SIZES]
+
+FONT = cv2.FONT_HERSHEY_DUPLEX
+FONT_THICKNESS = 2
+GIVEN_COLOR = (0, 0, 0)  # Black numbers if they were given
+SOLVED_COLOR = (0, 0, 255)  # Colored numbers if they were found by the solver
+# Number of board and image sizes for which templates and glyphs are kept
+RENDER_CACHE_SIZE = 16
+
+
+def get_optimal_font_scale(text, width, height):
+    for scale in range(60, 0, -1):
+        textSize = cv2.getTextSize(text, fontFace=FONT, fontScale=scale / 10, thickness=1)
+        new_width = textSize[0][0]
+        new_height = textSize[0][1]
+        if new_width <= width and new_height <= height:
+            return scale / 10
+    return 1
+
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def get_font_scale(board_size, width, height):
+    if board_size == 9:
+        # Horizontal margin of 20px per field and vertical margin of 1/25 of the image, at every size
+        return get_optimal_font_scale('0', width // 9 - 20, height // 9 - height // 25)
+    # Margins of 20px per field at 500x500, scaled with the image and the number of fields
+    return get_optimal_font_scale('0' * len(str(board_size)),
+                                  width // board_size - width * 9 // (25 * board_size),
+                                  height // board_size - height * 9 // (25 * board_size))
+
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def get_board_template(board_size, width, height):
+    """
+    Renders the empty board once per size. The image must not be modified, each rendered Sudoku works on a copy.
+    :return: BGR opencv-image (uint8 numpy array)
+    """
+    image = np.full((height, width, 3), 255, np.uint8)
+    x_step = width // board_size
+    y_step = height // board_size
+    x = x_step
+    y = y_step
+    for i in range(board_size - 1):
+        cv2.line(image, (0, y + (y_step // 5)), (width, y + (y_step // 5)), (0, 0, 0), 2)
+        cv2.line(image, (x, 0), (x, height), (0, 0, 0), 2)
+        x += x_step
+        y += y_step
+    image.flags.writeable = False
+    return image
+
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def get_color_plane(color, width, height):
+    """
+    :return: Image filled with the color, the source of the pixels of all numbers of this color
+    """
+    image = np.empty((height, width, 3), np.uint8)
+    image[:] = color
+    image.flags.writeable = False
+    return image
+
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def get_glyphs(board_size, width, height):
+    """
+    Rasterizes the numbers of the board once per size. Pixels are given as indices into the flattened image
+    extended by a margin on each side, so glyphs reaching over the border of the image need no clipping.
+    :return: Margin, index of the origin of the text (bottom left) of each field and a list indexed by the number
+             of the offsets of its pixels relative to the origin
+    """
+    font_scale = get_font_scale(board_size, width, height)
+    (text_width, text_height), baseline = cv2.getTextSize(str(board_size), FONT, font_scale, FONT_THICKNESS)
+    margin = max(text_width, text_height + baseline) + 2 * FONT_THICKNESS
+    stride = width + 2 * margin
+
+    x_step = width // board_size
+    y_step = height // board_size
+    rows, cols = np.divmod(np.arange(board_size * board_size), board_size)
+    origins = (margin + (rows + 1) * y_step) * stride + margin + cols * x_step + x_step // 5
+
+    offsets = [None]
+    for value in range(1, board_size + 1):
+        canvas = np.zeros((2 * margin, 2 * margin), np.uint8)
+        cv2.putText(canvas, str(value), (margin, margin), FONT, font_scale, 255, FONT_THICKNESS)
+        glyph_rows, glyph_cols = np.nonzero(canvas)
+        offsets.append((glyph_rows - margin) * stride + glyph_cols - margin)
+    return margin, origins, offsets
 
 
 class Sudoku(GridGame):
-    _cell_size = SUPPORTED_CELL_SIZE
+
+    def __init__(self, game: np.ndarray):
+        game = np.asarray(game)
+        if game.ndim != 2 or game.shape[0] != game.shape[1] or game.shape[0] not in SUPPORTED_BOARD_SIZES:
+            raise ValueError(f'Only board sizes of {", ".join(f"{size}x{size}" for size in SUPPORTED_BOARD_SIZES)} '
+                             f'are supported. Got {"x".join(map(str, game.shape))} instead.')
+        super().__init__(game)
+        self._cell_size = math.isqrt(game.shape[0])
 
     @staticmethod
     def from_flat_array(array: []):
         game = super(Sudoku, Sudoku).from_flat_array(array)
-        if game.get_size() != SUPPORTED_GAME_SIZE:
-            raise ValueError('Only board sizes of 9x9 are supported.')
         return Sudoku(game.game)
 
     def get_cell_size(self):
         return self._cell_size
 
-    def _get_optimal_font_scale(self, text, width, height):
-        for scale in range(60, 0, -1):
-            textSize = cv2.getTextSize(text, fontFace=cv2.FONT_HERSHEY_DUPLEX, fontScale=scale / 10, thickness=1)
-            new_width = textSize[0][0]
-            new_height = textSize[0][1]
-            if new_width <= width and new_height <= height:
-                return scale / 10
-        return 1
-
     def to_image(self, width=500, height=500, colored=True):
-        image = np.full((height, width, 3), 255, np.float)
-        x_step = width // 9
-        y_step = height // 9
-        font_scale = self._get_optimal_font_scale('0', x_step - 20, y_step - (height // 25))
-
-        # Draw board
-        x = x_step
-        y = y_step
-        for i in range(len(self.game) - 1):
-            cv2.line(image, (0, y + (y_step // 5)), (width, y + (y_step // 5)), (0, 0, 0), 2)
-            cv2.line(image, (x, 0), (x, height), (0, 0, 0), 2)
-            x += x_step
-            y += y_step
-
-        # Draw numbers
-        initial_game = self.initial_game()
-        y = height // 9
-        for i, row in enumerate(self.game):
-            x = x_step // 5
-            for j, value in enumerate(row):
-                if value != 0:
-                    if initial_game[i][j] != 0:
-                        color = (0, 0, 0)  # Black numbers if they were given
-                    else:
-                        color = (0, 0, 255)  # Colored numbers if they were found by solver
-
-                    text = str(value)
-                    cv2.putText(image,
-                                text,
-                                (x, y),
-                                cv2.FONT_HERSHEY_DUPLEX,
-                                font_scale,
-                                color,
-                                2)
-                x += x_step
-            y += y_step
+        """
+        Renders the board, given numbers in black and numbers found by the solver in color.
+        The empty board and the numbers are rasterized once per size, each image only copies their pixels.
+        :return: BGR opencv-image (uint8 numpy array)
+        """
+        board_size = self.get_height()
+        margin, origins, offsets = get_glyphs(board_size, width, height)
+
+        # Mark the pixels of the given numbers and of the numbers found by the solver
+        values = self.game.flatten()
+        given = self.initial_game().flatten() != 0
+        given_mask = np.zeros((height + 2 * margin, width + 2 * margin), np.uint8)
+        solved_mask = np.zeros_like(given_mask)
+        for value in np.unique(values[values != 0]):
+            fields = np.flatnonzero(values == value)
+            pixels = origins[fields, None] + offsets[value]
+            given_mask.reshape(-1)[pixels[given[fields]]] = 1
+            solved_mask.reshape(-1)[pixels[~given[fields]]] = 1
+
+        if np.any(given_mask & solved_mask):
+            # Numbers overlap on small images, the last field in row order wins as if they were drawn one by one
+            owner = np.full(given_mask.shape, -1, np.int32)
+            for value in np.unique(values[values != 0]):
+                fields = np.flatnonzero(values == value)
+                np.maximum.at(owner.reshape(-1), origins[fields, None] + offsets[value], fields[:, None])
+            drawn = owner >= 0
+            given_mask = (drawn & given[owner]).astype(np.uint8)
+            solved_mask = (drawn & ~given[owner]).astype(np.uint8)
 
+        image = get_board_template(board_size, width, height).copy()
+        inner = slice(margin, margin + height), slice(margin, margin + width)
+        cv2.copyTo(get_color_plane(GIVEN_COLOR, width, height), given_mask[inner], image)
+        cv2.copyTo(get_color_plane(SOLVED_COLOR, width, height), solved_mask[inner], image)
         return image
 
     def to_string(self):
         s = ''
         cell_size = self._cell_size
         size = self.get_height()
+        width = len(str(size))
+        box = "".join([f" {{:>{width}}}"] * cell_size) + " |"
         for i, row in enumerate(self.game):
-            s += ("|" + " {} {} {} |" * cell_size).format(*[x if x != 0 else " " for x in row]) + '\n'
-            if i != 0 and i % cell_size == 2 and not i == size - 1:
-                s += "|" + "+".join(["-------"] * cell_size) + "|" + '\n'
+            s += ("|" + box * cell_size).format(*[x if x != 0 else " " for x in row]) + '\n'
+            if i % cell_size == cell_size - 1 and not i == size - 1:
+                s += "|" + "+".join(["-" * (cell_size * (width + 1) + 1)] * cell_size) + "|" + '\n'
         return s
 
     def print(self):
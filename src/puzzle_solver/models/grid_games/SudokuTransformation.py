@@ -0,0 +1,139 @@
+import numpy as np
+
+
+class SudokuTransformation:
+    """
+    Validity preserving transformation of a Sudoku: transposition, permutation of rows within bands,
+    of bands, of columns within stacks, of stacks and relabeling of the numbers.
+    Applying it to a solution of a Sudoku results in a solution of the transformed Sudoku and vice versa.
+    """
+
+    def __init__(self, transpose, row_order, col_order, mapping):
+        """
+        :param transpose: Whether the board is transposed first
+        :param row_order: Row i of the transformed board is row row_order[i] of the (transposed) board
+        :param col_order: Column j of the transformed board is column col_order[j] of the (transposed) board
+        :param mapping: Number k is replaced by mapping[k], mapping[0] has to be 0
+        """
+        self.transpose = transpose
+        self.row_order = np.asarray(row_order)
+        self.col_order = np.asarray(col_order)
+        self.mapping = np.asarray(mapping)
+        self.inverse_mapping = np.argsort(self.mapping)
+
+    @staticmethod
+    def identity(board_size):
+        order = np.arange(board_size)
+        return SudokuTransformation(False, order, order, np.arange(board_size + 1))
+
+    def apply(self, grid):
+        grid = np.asarray(grid)
+        if self.transpose:
+            grid = grid.T
+        return self.mapping[grid[np.ix_(self.row_order, self.col_order)]]
+
+    def invert(self, grid):
+        grid = self.inverse_mapping[np.asarray(grid)]
+        result = np.empty_like(grid)
+        result[np.ix_(self.row_order, self.col_order)] = grid
+        if self.transpose:
+            result = result.T
+        return result
+
+    @staticmethod
+    def _compress(keys):
+        """
+        Replaces keys by their rank among all distinct keys, keeps them small between refinement rounds
+        """
+        ranks = {key: rank for rank, key in enumerate(sorted(set(keys)))}
+        return [ranks[key] for key in keys]
+
+    @staticmethod
+    def _refine(board, cell_size):
+        """
+        Computes keys for rows, columns and numbers which do not change under any transformation.
+        Starting with equal keys, each round distinguishes lines and numbers by the keys of what they are combined with
+        (similar to color refinement of graphs), until a round does not distinguish any more of them.
+        :return: Keys of the rows and keys of the columns
+        """
+        board_size = len(board)
+        filled = list(zip(*np.nonzero(board)))
+        row_keys = [0] * board_size
+        col_keys = [0] * board_size
+        value_keys = [0] * (board_size + 1)
+        classes = None
+        while True:
+            row_cells = [[] for _ in range(board_size)]
+            col_cells = [[] for _ in range(board_size)]
+            value_cells = [[] for _ in range(board_size + 1)]
+            for i, j in filled:
+                value = board[i, j]
+                row_cells[i].append((col_keys[j], value_keys[value]))
+                col_cells[j].append((row_keys[i], value_keys[value]))
+                value_cells[value].append((row_keys[i], col_keys[j]))
+
+            row_keys, col_keys, value_keys = (
+                SudokuTransformation._compress([(key, tuple(sorted(cells))) for key, cells in zip(keys, all_cells)])
+                for keys, all_cells in [(row_keys, row_cells), (col_keys, col_cells), (value_keys, value_cells)]
+            )
+
+            # Lines of the same band (stack) stay together, so the band is part of the key
+            row_keys = SudokuTransformation._with_block_keys(row_keys, cell_size)
+            col_keys = SudokuTransformation._with_block_keys(col_keys, cell_size)
+
+            # Keys are only ever split, so the keys are stable once their number does not grow anymore
+            previous, classes = classes, (len(set(row_keys)), len(set(col_keys)), len(set(value_keys)))
+            if classes == previous:
+                return row_keys, col_keys
+
+    @staticmethod
+    def _with_block_keys(keys, cell_size):
+        block_keys = [tuple(sorted(keys[block * cell_size:(block + 1) * cell_size])) for block in range(cell_size)]
+        return SudokuTransformation._compress([(block_keys[line // cell_size], key) for line, key in enumerate(keys)])
+
+    @staticmethod
+    def _order(keys, cell_size):
+        """
+        Orders the lines (rows or columns) of a board, first the blocks of lines (bands or stacks) by their keys,
+        then the lines within each block
+        """
+        blocks = []
+        for block in range(cell_size):
+            lines = range(block * cell_size, (block + 1) * cell_size)
+            lines = sorted(lines, key=lambda line: keys[line])
+            blocks.append((tuple(keys[line] for line in lines), lines))
+        blocks.sort(key=lambda block: block[0])
+        return np.array([line for _, lines in blocks for line in lines])
+
+    @staticmethod
+    def canonicalize(grid, cell_size):
+        """
+        Maps equivalent Sudokus to the same board where possible.
+        Lines are ordered by invariant keys, ties keep their original order, so not all equivalent Sudokus are found.
+        Every result is exact though: equal canonical boards have the same solutions after mapping them back.
+        :param grid: Board of the Sudoku, 0 for empty fields
+        :param cell_size: Size of a box, e.g. 3 for a 9x9 Sudoku
+        :return: Canonical board and the transformation which leads to it
+        """
+        grid = np.asarray(grid)
+        board_size = len(grid)
+        best = None
+        for transpose in [False, True]:
+            board = grid.T if transpose else grid
+            row_keys, col_keys = SudokuTransformation._refine(board, cell_size)
+            row_order = SudokuTransformation._order(row_keys, cell_size)
+            col_order = SudokuTransformation._order(col_keys, cell_size)
+
+            # Relabel numbers in order of their first appearance, missing numbers keep their relative order
+            ordered = board[np.ix_(row_order, col_order)].flatten()
+            values, first = np.unique(ordered[ordered != 0], return_index=True)
+            appearance = list(values[np.argsort(first)])
+            appearance += [value for value in range(1, board_size + 1) if value not in appearance]
+            mapping = np.zeros(board_size + 1, int)
+            mapping[appearance] = np.arange(1, board_size + 1)
+
+            transformation = SudokuTransformation(transpose, row_order, col_order, mapping)
+            canonical = transformation.apply(grid)
+            if best is None or canonical.tobytes() < best[0].tobytes():
+                best = canonical, transformation
+        return best
@@ -1,2 +1,3 @@
 from .GridGame import GridGame
 from .Sudoku import Sudoku
+from .SudokuTransformation import SudokuTransformation
@@ -1,15 +1,54 @@
 import logging
 import math
-import sys
 
 import cv2
 import numpy as np
 
+from puzzle_solver.metrics import stage_seconds
+
 log = logging.getLogger(__name__)
 
+CORNERS_NEAREST = 'nearest'
+CORNERS_APPROX = 'approx'
+CORNER_METHODS = [CORNERS_NEAREST, CORNERS_APPROX]
+
+TILING_HOUGH = 'hough'
+TILING_GRID = 'grid'
+TILINGS = [TILING_HOUGH, TILING_GRID]
+
+BORDER_SIZE = 10
+
 
 class GridGameScanner:
 
+    def __init__(self, corner_method=CORNERS_NEAREST, detection_size=None, warp_size=None, tiling=TILING_HOUGH,
+                 grid_size=None, refine_grid=True):
+        """
+        :param corner_method: 'nearest' uses the contour points closest to the corners of the minimum area rectangle,
+                              'approx' approximates the compressed contour by a polygon and uses its four vertices
+        :param detection_size: Find the board on a copy downscaled to at most this width and height,
+                               None to use the full resolution
+        :param warp_size: Warp the board from the original image into a square of this size,
+                          None to keep the size of the image
+        :param tiling: 'hough' splits the board along the lines found by the Hough transformation,
+                       'grid' splits it into grid_size x grid_size equal tiles
+        :param grid_size: Number of tiles per row and column of the board, if known. Also used as fallback if the
+                          Hough transformation finds a different number of tiles.
+        :param refine_grid: Move the lines of the 'grid' tiling to the darkest row or column nearby
+        """
+        if corner_method not in CORNER_METHODS:
+            raise ValueError(f'Unknown corner method {corner_method}. Expected one of {CORNER_METHODS}')
+        if tiling not in TILINGS:
+            raise ValueError(f'Unknown tiling {tiling}. Expected one of {TILINGS}')
+        if tiling == TILING_GRID and not grid_size:
+            raise ValueError(f'The {TILING_GRID} tiling requires the grid size')
+        self._corner_method = corner_method
+        self._detection_size = detection_size
+        self._warp_size = warp_size
+        self._tiling = tiling
+        self._grid_size = grid_size
+        self._refine_grid = refine_grid
+
     @staticmethod
     def detect_lines(image, threshold1=20, threshold2=100):
         dst = cv2.Canny(image, threshold1, threshold2, None, 3)
@@ -34,9 +73,9 @@ class GridGameScanner:
         return image
 
     @staticmethod
-    def find_biggest_contour(image, threshold1=20, threshold2=100):
+    def find_biggest_contour(image, threshold1=20, threshold2=100, approximation=cv2.CHAIN_APPROX_NONE):
         dst = cv2.Canny(image, threshold1, threshold2, None, 3)
-        contours, hierarchy = cv2.findContours(dst, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+        contours, hierarchy = cv2.findContours(dst, cv2.RETR_EXTERNAL, approximation)
         sorted_contours = sorted(contours, key=cv2.contourArea, reverse=True)
         return sorted_contours[0]  # largest item
 
@@ -44,23 +83,28 @@ class GridGameScanner:
     def get_corners_of_contour(contour):
         # Find smallest rectangle which includes the contour
         rect = cv2.minAreaRect(contour)
-        box = np.int0(cv2.boxPoints(rect))
-
-        # Find corners using the euclidean distance
-        corners = []
-        for reference_point in box:
-            corner = []
-            corner_distance = sys.maxsize
-            for point in contour:
-                distance = np.linalg.norm(reference_point - point[0])
-                if distance < corner_distance:
-                    corner = point
-                    corner_distance = distance
-            corners.append(corner)
-        corners = np.array(corners)
+        box = cv2.boxPoints(rect).astype(np.intp)
+
+        # Find corners using the euclidean distance, squared distances of all (box point, contour point) pairs at once.
+        # argmin picks the first of equally distant points, like a loop would.
+        differences = box[:, None, :] - contour[None, :, 0, :].astype(np.intp)
+        distances = np.einsum('ijk,ijk->ij', differences, differences)
+        corners = contour[np.argmin(distances, axis=1)]
         corners = GridGameScanner.sort_corners(corners)
         return corners
 
+    @staticmethod
+    def get_corners_of_polygon(contour, epsilon=0.02):
+        """
+        Approximates the contour by a polygon. Falls back to get_corners_of_contour if it is no quadrilateral.
+        :param epsilon: Maximum distance between contour and polygon, relative to the perimeter of the contour
+        """
+        polygon = cv2.approxPolyDP(contour, epsilon * cv2.arcLength(contour, True), True)
+        if len(polygon) != 4:
+            log.debug(f'Approximated board by {len(polygon)} instead of 4 corners')
+            return GridGameScanner.get_corners_of_contour(contour)
+        return GridGameScanner.sort_corners(polygon)
+
     @staticmethod
     def sort_corners(pts):
         """
@@ -75,39 +119,76 @@ class GridGameScanner:
         return np.stack([tl, tr, bl, br])
 
     @staticmethod
-    def perspective_transform(img, to_pts, from_pts=None):
-        width = len(img[0])
-        height = len(img)
+    def downscale(image, max_size):
+        """
+        Shrinks the image to at most max_size pixels in width and height
+        :return: Downscaled image and the applied scale factor
+        """
+        scale = max_size / max(image.shape[:2])
+        if scale >= 1:
+            return image, 1.0
+        return cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA), scale
+
+    @staticmethod
+    def perspective_transform(img, to_pts, from_pts=None, size=None, border_value=0):
+        """
+        :param size: Size (width, height) of the result, defaults to the size of img
+        :param border_value: Color of areas outside of img
+        """
+        width, height = size or (len(img[0]), len(img))
 
         if from_pts is None:
             from_pts = np.array([[0, 0], [width, 0], [0, height], [width, height]], np.float32)
 
         matrix = cv2.getPerspectiveTransform(to_pts, from_pts)
-        warped = cv2.warpPerspective(img, matrix, (width, height))
+        warped = cv2.warpPerspective(img, matrix, (width, height), borderMode=cv2.BORDER_CONSTANT,
+                                     borderValue=border_value)
         return warped
 
+    def find_board(self, image):
+        """
+        Finds the corners of the board, on a downscaled copy if detection_size is set
+        :return: Corners (top left, top right, bottom left, bottom right) in coordinates of the image
+        """
+        log.debug('Looking for the largest contour')
+        with stage_seconds.time(stage='contour'):
+            scale = 1.0
+            if self._detection_size:
+                image, scale = self.downscale(image, self._detection_size)
+            image = self.add_border_to_image(image, BORDER_SIZE)
+            if self._corner_method == CORNERS_APPROX:
+                largest_item = self.find_biggest_contour(image, approximation=cv2.CHAIN_APPROX_SIMPLE)
+            else:
+                largest_item = self.find_biggest_contour(image)
+
+        log.debug('Searching corners of contour')
+        with stage_seconds.time(stage='corners'):
+            if self._corner_method == CORNERS_APPROX:
+                corners = self.get_corners_of_polygon(largest_item)
+            else:
+                corners = self.get_corners_of_contour(largest_item)
+        return (corners.astype(np.float32) - BORDER_SIZE) / scale
+
     @staticmethod
     def merge_lines(lines, rho_threshold=10, theta_threshold=0.2):
+        """
+        Greedily merges each line with all remaining lines close to it into their average
+        """
+        rhos = lines[:, 0, 0].astype(np.float64)
+        thetas = lines[:, 0, 1].astype(np.float64)
+        remaining = np.ones(len(rhos), bool)
         new_lines = []
-        lines = lines.tolist()
-        while len(lines) > 0:
-            rho = lines[0][0][0]
-            theta = lines[0][0][1]
-
-            tmp_lines = [lines[0]]
-            for j in range(1, len(lines)):
-                rho_j = lines[j][0][0]
-                theta_j = lines[j][0][1]
-                if rho + rho_threshold > rho_j > rho - rho_threshold \
-                        and theta + theta_threshold > theta_j > theta - theta_threshold:
-                    tmp_lines.append(lines[j])
-
-            avg_rho = sum([line[0][0] for line in tmp_lines]) / len(tmp_lines)
-            avg_theta = sum([line[0][1] for line in tmp_lines]) / len(tmp_lines)
+        while remaining.any():
+            first = np.argmax(remaining)
+            rho, theta = rhos[first], thetas[first]
+            close = remaining & (rho + rho_threshold > rhos) & (rhos > rho - rho_threshold) \
+                & (theta + theta_threshold > thetas) & (thetas > theta - theta_threshold)
+
+            # Summed in Python to average exactly like a plain loop
+            avg_rho = sum(rhos[close].tolist()) / np.count_nonzero(close)
+            avg_theta = sum(thetas[close].tolist()) / np.count_nonzero(close)
             new_lines.append([[avg_rho, avg_theta]])
-
-            for line in tmp_lines:
-                lines.remove(line)
+            remaining &= ~close
         return np.array(new_lines)
 
     @staticmethod
@@ -167,24 +248,95 @@ class GridGameScanner:
             last_row = int(rows[i])
         return tiles
 
-    def scan(self, image):
-        log.debug('Looking for the largest contour')
-        image = self.add_border_to_image(image, 10)
-        largest_item = self.find_biggest_contour(image)
-
-        log.debug('Searching corners of contour')
-        corners = self.get_corners_of_contour(largest_item)
+    @staticmethod
+    def find_grid_lines(image, grid_size, refine=True, search_range=0.25):
+        """
+        Positions of the lines of an evenly divided grid filling the whole image
+        :param refine: Move each line to the row/column with the most ink (projection profile) within search_range
+        :param search_range: Distance a line may be moved, relative to the size of a tile
+        :return: Row and column positions, grid_size + 1 each
+        """
+        height, width = image.shape[:2]
+        rows = np.linspace(0, height, grid_size + 1)
+        cols = np.linspace(0, width, grid_size + 1)
+        if not refine:
+            return rows.astype(int), cols.astype(int)
+
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        ink = 255 - image.astype(np.int32)
+        profiles = [ink.sum(axis=1), ink.sum(axis=0)]
+        refined = []
+        for positions, profile in zip([rows, cols], profiles):
+            reach = max(1, int(search_range * len(profile) / grid_size))
+            lines = []
+            for position in positions:
+                start = max(0, int(position) - reach)
+                end = min(len(profile), int(position) + reach + 1)
+                lines.append(start + int(np.argmax(profile[start:end])))
+            refined.append(np.array(lines))
+        return refined[0], refined[1]
 
-        log.debug('Perform perspective transformation')
-        warped = self.perspective_transform(image, corners.astype(np.float32))
+    @staticmethod
+    def split_image_into_grid(rows, cols, padding=3):
+        """
+        :param rows: Positions of the horizontal lines
+        :param cols: Positions of the vertical lines
+        :return: Tiles between the lines, row by row
+        """
+        return [
+            {
+                'row_start': int(rows[i]) + padding,
+                'row_end': int(rows[i + 1]) - padding,
+                'col_start': int(cols[j]) + padding,
+                'col_end': int(cols[j + 1]) - padding
+            }
+            for i in range(len(rows) - 1) for j in range(len(cols) - 1)
+        ]
+
+    def find_tiles(self, warped):
+        """
+        Splits the warped board into tiles using the configured tiling
+        """
+        if self._tiling == TILING_HOUGH:
+            padding = len(warped) // 100
+            log.debug('Search for lines')
+            with stage_seconds.time(stage='lines'):
+                lines = self.detect_lines(warped)
+                if lines is not None:
+                    lines = self.merge_lines(lines, rho_threshold=20, theta_threshold=0.5)
+            log.debug(f'{0 if lines is None else len(lines)} lines detected')
+
+            log.debug('Split image into tiles')
+            with stage_seconds.time(stage='tiles'):
+                try:
+                    tiles = self.split_image_into_tiles(lines, padding=padding) if lines is not None else []
+                except ValueError:  # No horizontal or no vertical lines
+                    if not self._grid_size:
+                        raise
+                    tiles = []
+            if not self._grid_size or len(tiles) == self._grid_size ** 2:
+                return tiles
+            log.warning(f'Found {len(tiles)} instead of {self._grid_size ** 2} tiles, falling back to grid tiling')
+
+        log.debug('Split image into grid')
+        with stage_seconds.time(stage='tiles'):
+            rows, cols = self.find_grid_lines(warped, self._grid_size, self._refine_grid)
+            # Keeps thick box lines out of the tiles
+            padding = len(warped) // self._grid_size // 10
+            return self.split_image_into_grid(rows, cols, padding=padding)
 
-        log.debug('Search for lines')
-        lines = self.detect_lines(warped)
-        lines = self.merge_lines(lines, rho_threshold=20, theta_threshold=0.5)
-        log.debug(f'{len(lines)} lines detected')
+    def scan(self, image):
+        corners = self.find_board(image)
 
-        log.debug('Split image into tiles')
-        padding = len(warped) // 100
-        tiles = self.split_image_into_tiles(lines, padding=padding)
+        log.debug('Perform perspective transformation')
+        with stage_seconds.time(stage='warp'):
+            if self._warp_size:
+                size = (self._warp_size, self._warp_size)
+            else:
+                size = (image.shape[1] + 2 * BORDER_SIZE, image.shape[0] + 2 * BORDER_SIZE)
+            # Areas outside of the image are white, as if the image had a white border
+            warped = self.perspective_transform(image, corners, size=size, border_value=255)
 
+        tiles = self.find_tiles(warped)
         return warped, tiles
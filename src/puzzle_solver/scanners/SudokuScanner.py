@@ -1,25 +1,65 @@
-import configparser
 import logging
-import os
 
 import cv2
 import numpy as np
-import pytesseract
-from tqdm import tqdm
 
+from puzzle_solver import metrics
+from puzzle_solver.metrics import stage_seconds
 from puzzle_solver.models.grid_games import Sudoku
+from puzzle_solver.models.grid_games.Sudoku import SUPPORTED_BOARD_SIZES
 from puzzle_solver.scanners import GridGameScanner
+from puzzle_solver.scanners.GridGameScanner import CORNERS_NEAREST, TILING_HOUGH
+from puzzle_solver.scanners.recognizers import TemplateRecognizer, TesseractRecognizer
+from puzzle_solver.scanners.recognizers.TesseractRecognizer import OCR_MODE_SINGLE
+from puzzle_solver.settings import get_settings
 
 log = logging.getLogger(__name__)
 
-CHAR_BLACKLIST = ['\n', '\r', '\t', '\f', '\v', '\n\f', '\r\n']
+RECOGNIZER_TESSERACT = 'tesseract'
+RECOGNIZER_TEMPLATE = 'template'
+RECOGNIZERS = [RECOGNIZER_TESSERACT, RECOGNIZER_TEMPLATE]
+
+DEFAULT_BOARD_SIZE = 9
+
+# A tile is considered empty if less ink than this fraction of its area is found ...
+MIN_INK_DENSITY = 0.01
+# ... or if there is no component of at least this height (relative to the tile) near its center
+MIN_DIGIT_HEIGHT = 0.2
+
+ocr_calls = metrics.registry.counter('puzzle_solver_ocr_calls_total', 'Number of tiles passed to the digit recognizer')
+ocr_skipped = metrics.registry.counter('puzzle_solver_ocr_skipped_total',
+                                       'Number of tiles skipped by the empty tile filter')
 
 
 class SudokuScanner(GridGameScanner):
 
     def __init__(self):
-        self._config = configparser.ConfigParser()
-        self._config.read(os.environ.get('PUZZLE_SOLVER_CONFIG_FILE'))
+        self._config = get_settings()
+        self._board_size = self._config.getint('scanner', 'board_size', fallback=DEFAULT_BOARD_SIZE)
+        if self._board_size not in SUPPORTED_BOARD_SIZES:
+            raise ValueError(f'Unsupported board size {self._board_size}. Expected one of {SUPPORTED_BOARD_SIZES}')
+        super().__init__(self._config.get('scanner', 'corner_method', fallback=CORNERS_NEAREST),
+                         self._config.getint('scanner', 'detection_size', fallback=0) or None,
+                         self._config.getint('scanner', 'warp_size', fallback=0) or None,
+                         self._config.get('scanner', 'tiling', fallback=TILING_HOUGH),
+                         self._board_size,
+                         self._config.getboolean('scanner', 'refine_grid', fallback=True))
+        self._recognizer = self.create_recognizer(self._config, len(str(self._board_size)))
+        self._empty_filter = self._config.getboolean('scanner', 'empty_filter', fallback=True)
+
+    @staticmethod
+    def create_recognizer(config, max_digits=1):
+        """
+        :param max_digits: Maximum number of digits per tile, e.g. 2 for 16x16 boards
+        """
+        recognizer = config.get('scanner', 'recognizer', fallback=RECOGNIZER_TESSERACT)
+        if recognizer == RECOGNIZER_TESSERACT:
+            ocr_mode = config.get('tesseract', 'ocr_mode', fallback=OCR_MODE_SINGLE)
+            show_progress = config['general'].getint('log_level') == logging.DEBUG
+            return TesseractRecognizer(ocr_mode, show_progress, max_digits)
+        elif recognizer == RECOGNIZER_TEMPLATE:
+            return TemplateRecognizer(config.get('scanner', 'template_file', fallback=None), max_digits=max_digits)
+        raise ValueError(f'Unknown recognizer {recognizer}. Expected one of {RECOGNIZERS}')
 
     @staticmethod
     def convert_to_binary_image(image):
@@ -27,45 +67,132 @@ class SudokuScanner(GridGameScanner):
         thr = cv2.adaptiveThreshold(image, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY, 21, 23)
         return thr
 
-    def find_numbers_in_tiled_image(self, image, tiles):
-        cells = []
-
-        log_level = self._config['general'].getint('log_level')
-        if log_level == logging.DEBUG:
-            iterator = tqdm(tiles)
-        else:
-            iterator = tiles
-
-        for tile in iterator:
+    @staticmethod
+    def cut_out_tiles(image, tiles):
+        cutouts = []
+        for tile in tiles:
             cutout = np.copy(image[tile['row_start']:tile['row_end'], tile['col_start']:tile['col_end']])
             cutout = SudokuScanner.add_border_to_image(cutout, 10)
+            cutouts.append(cutout)
+        return cutouts
+
+    @staticmethod
+    def remove_grid_lines(binary, tiles):
+        """
+        Removes components larger than a tile, i.e. the grid, so no remains of grid lines end up in the tiles
+        :param binary: Binary image of the whole board, dark digits on bright background
+        :return: Copy of the image without the grid
+        """
+        if not tiles:
+            return binary
+        tile_height = np.median([tile['row_end'] - tile['row_start'] for tile in tiles])
+        tile_width = np.median([tile['col_end'] - tile['col_start'] for tile in tiles])
+        count, labels, stats, centroids = cv2.connectedComponentsWithStats((binary < 128).astype(np.uint8),
+                                                                           connectivity=8)
+        is_grid = (stats[:, cv2.CC_STAT_HEIGHT] > 1.5 * tile_height) | (stats[:, cv2.CC_STAT_WIDTH] > 1.5 * tile_width)
+        is_grid[0] = False  # background
+        result = binary.copy()
+        result[is_grid[labels]] = 255
+        return result
 
-            # psm=10: Treat the image as single character
-            # -c tessedit_char_whitelist=123456789: Limit the searched characters to 123456789
-            cell = pytesseract.image_to_string(cutout, config='--psm 10 -c tessedit_char_whitelist=123456789')
-            if cell and cell not in CHAR_BLACKLIST:
-                try:
-                    cell = int(cell)
-                except ValueError:
-                    log.warning(f'Unable to parse {repr(cell)} to int!')
-                    cell = 0
-            else:
-                cell = 0
-
-            cells.append(cell)
+    @staticmethod
+    def find_empty_tiles(binary, tiles, max_digits=1):
+        """
+        Detects tiles which clearly contain no digit, using the ink density and the connected components of the board
+        :param binary: Binary image of the whole board, dark digits on bright background
+        :param tiles: List of tiles
+        :param max_digits: Maximum number of digits per tile, the digits of longer numbers lie further off the center
+        :return: Boolean numpy array, True for each empty tile
+        """
+        if not tiles:
+            return np.zeros(0, bool)
+
+        ink = (binary < 128).astype(np.uint8)
+        row_start = np.array([tile['row_start'] for tile in tiles])
+        row_end = np.array([tile['row_end'] for tile in tiles])
+        col_start = np.array([tile['col_start'] for tile in tiles])
+        col_end = np.array([tile['col_end'] for tile in tiles])
+        tile_height = row_end - row_start
+        tile_width = col_end - col_start
+
+        # Ink per tile in constant time using the integral image
+        integral = cv2.integral(ink)
+        ink_count = integral[row_end, col_end] - integral[row_start, col_end] \
+            - integral[row_end, col_start] + integral[row_start, col_start]
+        density = ink_count / np.maximum(tile_height * tile_width, 1)
+
+        # Look for digit sized components whose center lies in the middle of a tile (tiles x components)
+        count, labels, stats, centroids = cv2.connectedComponentsWithStats(ink, connectivity=8)
+        cx, cy = centroids[1:, 0], centroids[1:, 1]
+        height = stats[1:, cv2.CC_STAT_HEIGHT]
+        width = stats[1:, cv2.CC_STAT_WIDTH]
+        is_centered = (np.abs(cx[None, :] - (col_start + col_end)[:, None] / 2)
+                       < tile_width[:, None] / 4 * (max_digits + 1) / 2) \
+            & (np.abs(cy[None, :] - (row_start + row_end)[:, None] / 2) < tile_height[:, None] / 4)
+        is_digit_sized = (height[None, :] >= MIN_DIGIT_HEIGHT * tile_height[:, None]) \
+            & (height[None, :] <= 1.5 * tile_height[:, None]) \
+            & (width[None, :] <= 1.5 * tile_width[:, None])
+        has_digit = (is_centered & is_digit_sized).any(axis=1)
+
+        return (density < MIN_INK_DENSITY) | ~has_digit
+
+    def find_numbers_in_tiled_image(self, image, tiles, empty=None):
+        """
+        Recognizes the number in each tile
+        :param image: Binary image of the board
+        :param tiles: List of tiles
+        :param empty: Optional boolean mask of tiles which are known to be empty and are skipped
+        :return: List of numbers, 0 for empty tiles
+        """
+        if empty is None:
+            empty = np.zeros(len(tiles), bool)
+
+        cells = [0] * len(tiles)
+        indices = np.flatnonzero(~empty)
+        cutouts = self.cut_out_tiles(image, [tiles[i] for i in indices])
+        for i, cell in zip(indices, self._recognizer.recognize(cutouts)):
+            cells[i] = cell
         return cells
 
-    def scan(self, image):
+    def scan_with_statistics(self, image):
+        """
+        Scans the image like scan, but additionally returns statistics about the scan
+        :return: Sudoku and dictionary of statistics
+        """
         preprocessed_image, tiles = super().scan(image)
 
         log.debug('Convert image to binary image')
-        binary = self.convert_to_binary_image(preprocessed_image)
-        binary = cv2.cvtColor(binary, cv2.COLOR_GRAY2RGB)
+        with stage_seconds.time(stage='binarize'):
+            binary = self.convert_to_binary_image(preprocessed_image)
+            if self._board_size > DEFAULT_BOARD_SIZE:
+                # The tiles of larger boards are small, remains of the grid lines would be taken for digits
+                binary = self.remove_grid_lines(binary, tiles)
+
+        if self._empty_filter:
+            log.debug('Search for empty tiles')
+            with stage_seconds.time(stage='empty_filter'):
+                empty = self.find_empty_tiles(binary, tiles, len(str(self._board_size)))
+        else:
+            empty = np.zeros(len(tiles), bool)
+        statistics = {
+            'tiles': len(tiles),
+            'ocr_calls': int(np.count_nonzero(~empty)),
+            'ocr_skipped': int(np.count_nonzero(empty)),
+        }
+        ocr_calls.inc(statistics['ocr_calls'])
+        ocr_skipped.inc(statistics['ocr_skipped'])
+        log.debug(f'Skipping OCR for {statistics["ocr_skipped"]} of {statistics["tiles"]} tiles')
 
         log.debug('Scan tiles using OCR')
-        cells = self.find_numbers_in_tiled_image(binary, tiles)
+        with stage_seconds.time(stage='ocr'):
+            binary = cv2.cvtColor(binary, cv2.COLOR_GRAY2RGB)
+            cells = self.find_numbers_in_tiled_image(binary, tiles, empty)
 
         log.debug('Convert to sudoku model')
         sudoku = Sudoku.from_flat_array(cells)
 
+        return sudoku, statistics
+
+    def scan(self, image):
+        sudoku, statistics = self.scan_with_statistics(image)
         return sudoku
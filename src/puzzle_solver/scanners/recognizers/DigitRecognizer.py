@@ -0,0 +1,12 @@
+class DigitRecognizer:
+    """
+    Base class of all recognizers which turn the tiles of a grid game into numbers
+    """
+
+    def recognize(self, cutouts):
+        """
+        Recognizes the number in each tile
+        :param cutouts: List of opencv-images, one per tile
+        :return: List of numbers, 0 for empty tiles
+        """
+        raise NotImplementedError
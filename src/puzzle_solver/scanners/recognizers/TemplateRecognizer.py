@@ -0,0 +1,167 @@
+import logging
+import os
+
+import cv2
+import numpy as np
+
+from puzzle_solver.scanners.recognizers import DigitRecognizer
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TEMPLATE_FILE = os.path.join(os.path.dirname(__file__), 'resources', 'digit_templates.npz')
+TEMPLATE_SIZE = 28
+TEMPLATE_MARGIN = 2
+MIN_DIGIT_HEIGHT = 0.2  # relative to the height of the tile
+MIN_SIMILARITY = 0.5
+
+
+class TemplateRecognizer(DigitRecognizer):
+    """
+    Classifies printed digits by comparing normalized crops of the tiles against a set of labeled templates (1-NN).
+    All tiles are classified with a single matrix multiplication.
+    """
+
+    def __init__(self, template_file=None, min_similarity=MIN_SIMILARITY, max_digits=1):
+        """
+        :param max_digits: Maximum number of digits per tile, e.g. 2 for 16x16 boards
+        """
+        if template_file is None:
+            template_file = DEFAULT_TEMPLATE_FILE
+        if not os.path.exists(template_file):
+            raise FileNotFoundError(f'{template_file} does not exist. Build it using scripts/build_digit_templates.py')
+
+        with np.load(template_file) as data:
+            self._templates = self.normalize_features(data['templates'])
+            self._labels = data['labels'].astype(int)
+        self._min_similarity = min_similarity
+        self._max_digits = max_digits
+        log.debug(f'Loaded {len(self._labels)} digit templates from {template_file}')
+
+    @staticmethod
+    def normalize_features(features):
+        features = features.reshape(len(features), -1).astype(np.float32)
+        norms = np.linalg.norm(features, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return features / norms
+
+    @staticmethod
+    def find_digit_mask(cutout, max_digits=1):
+        """
+        :param cutout: opencv-image of a single tile, dark digit on bright background
+        :param max_digits: Maximum number of digits, the digits of longer numbers lie further off the center
+        :return: Boolean mask of the components forming the number in the tile or None if the tile is empty
+        """
+        if cutout.ndim == 3:
+            cutout = cv2.cvtColor(cutout, cv2.COLOR_RGB2GRAY)
+        ink = (cutout < 128).astype(np.uint8)
+        height, width = ink.shape
+
+        # Keep components in the center of the tile, this drops remains of the grid lines at the edges
+        count, labels, stats, centroids = cv2.connectedComponentsWithStats(ink, connectivity=8)
+        cx, cy = centroids[1:, 0], centroids[1:, 1]
+        digit_height = stats[1:, cv2.CC_STAT_HEIGHT]
+        is_digit = (digit_height >= MIN_DIGIT_HEIGHT * height) \
+            & (np.abs(cx - width / 2) < width / 4 * (max_digits + 1) / 2) \
+            & (np.abs(cy - height / 2) < height / 4)
+        if not is_digit.any():
+            return None
+        if max_digits > 1:
+            # All digits of a number have about the height of the digit closest to the center, unlike grid lines
+            center = np.argmin(np.where(is_digit, np.abs(cx - width / 2), np.inf))
+            is_digit &= np.abs(digit_height - digit_height[center]) <= digit_height[center] / 4
+        return np.isin(labels, np.flatnonzero(is_digit) + 1)
+
+    @staticmethod
+    def split_digits(digit, max_digits):
+        """
+        Splits the mask of a number into its digits at the columns without ink
+        :return: List of masks, the whole mask if it does not split into at most max_digits parts
+        """
+        columns = np.concatenate([[False], digit.any(axis=0), [False]])
+        edges = np.flatnonzero(columns[1:] != columns[:-1])
+        starts, ends = edges[0::2], edges[1::2]
+        if not 1 < len(starts) <= max_digits:
+            return [digit]
+        return [digit[:, start:end] for start, end in zip(starts, ends)]
+
+    @staticmethod
+    def normalize_digit(digit, size=TEMPLATE_SIZE):
+        """
+        Crops a digit and scales it into a square image of fixed size
+        :param digit: Boolean mask of the digit
+        :param size: Width and height of the resulting image
+        :return: Grayscale image with the digit as bright pixels
+        """
+        rows = np.flatnonzero(digit.any(axis=1))
+        cols = np.flatnonzero(digit.any(axis=0))
+        crop = digit[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1].astype(np.uint8) * 255
+
+        # Scale the longer side to the target size and keep the aspect ratio
+        inner = size - 2 * TEMPLATE_MARGIN
+        scale = inner / max(crop.shape)
+        crop_height = max(1, round(crop.shape[0] * scale))
+        crop_width = max(1, round(crop.shape[1] * scale))
+        crop = cv2.resize(crop, (crop_width, crop_height), interpolation=cv2.INTER_AREA)
+
+        result = np.zeros((size, size), np.uint8)
+        y = (size - crop_height) // 2
+        x = (size - crop_width) // 2
+        result[y:y + crop_height, x:x + crop_width] = crop
+
+        # Blur to tolerate small differences in stroke width and position
+        return cv2.GaussianBlur(result, (5, 5), 0)
+
+    @staticmethod
+    def extract_digit(cutout, size=TEMPLATE_SIZE):
+        """
+        Crops the digit of a tile and scales it into a square image of fixed size
+        :param cutout: opencv-image of a single tile, dark digit on bright background
+        :param size: Width and height of the resulting image
+        :return: Grayscale image with the digit as bright pixels or None if the tile is empty
+        """
+        digit = TemplateRecognizer.find_digit_mask(cutout)
+        if digit is None:
+            return None
+        return TemplateRecognizer.normalize_digit(digit, size)
+
+    @staticmethod
+    def extract_digits(cutout, max_digits=1, size=TEMPLATE_SIZE):
+        """
+        Like extract_digit, but returns one image per digit of the number in the tile
+        :return: List of images, empty if the tile is empty
+        """
+        digit = TemplateRecognizer.find_digit_mask(cutout, max_digits)
+        if digit is None:
+            return []
+        return [TemplateRecognizer.normalize_digit(part, size)
+                for part in TemplateRecognizer.split_digits(digit, max_digits)]
+
+    def recognize(self, cutouts):
+        cells = [0] * len(cutouts)
+        digits = [self.extract_digits(cutout, self._max_digits) for cutout in cutouts]
+        # Flat list of all digits, the position of each digit within its number and the tile it belongs to
+        positions = [(i, position) for i, parts in enumerate(digits) for position in range(len(parts))]
+        if not positions:
+            return cells
+
+        features = self.normalize_features(np.stack([part for parts in digits for part in parts]))
+        similarities = features @ self._templates.T
+        # Numbers do not start with 0, templates of 0 are only used for later digits, e.g. of 10
+        first = np.array([position == 0 for _, position in positions])
+        similarities[np.ix_(first, self._labels == 0)] = -1
+        best = np.argmax(similarities, axis=1)
+        best_similarity = similarities[np.arange(len(best)), best]
+
+        numbers = [''] * len(cutouts)
+        for (i, position), template, similarity in zip(positions, best, best_similarity):
+            if numbers[i] is None:
+                continue
+            if similarity >= self._min_similarity:
+                numbers[i] += str(self._labels[template])
+            else:
+                log.warning(f'Unable to classify tile {i}, best match {self._labels[template]} ({similarity:.2f})')
+                numbers[i] = None
+        for i, number in enumerate(numbers):
+            if number:
+                cells[i] = int(number)
+        return cells
@@ -0,0 +1,186 @@
+import logging
+import threading
+import weakref
+
+import numpy as np
+
+from puzzle_solver.scanners.recognizers import DigitRecognizer
+
+log = logging.getLogger(__name__)
+
+CHAR_BLACKLIST = ['\n', '\r', '\t', '\f', '\v', '\n\f', '\r\n']
+CHAR_WHITELIST = '123456789'
+# Numbers of boards larger than 9x9 may contain zeros, e.g. 10
+NUMBER_WHITELIST = '0123456789'
+
+# psm=10: Treat the image as single character
+# -c tessedit_char_whitelist=123456789: Limit the searched characters to 123456789
+TESSERACT_CONFIG = f'--psm 10 -c tessedit_char_whitelist={CHAR_WHITELIST}'
+# psm=8: Treat the image as a single word, for tiles with numbers of several digits
+TESSERACT_NUMBER_CONFIG = f'--psm 8 -c tessedit_char_whitelist={NUMBER_WHITELIST}'
+# psm=6: Treat the image as a single uniform block of text (one tile per line of the montage)
+TESSERACT_MONTAGE_CONFIG = f'--psm 6 -c tessedit_char_whitelist={CHAR_WHITELIST}'
+TESSERACT_MONTAGE_NUMBER_CONFIG = f'--psm 6 -c tessedit_char_whitelist={NUMBER_WHITELIST}'
+
+OCR_MODE_SINGLE = 'single'
+OCR_MODE_BATCH = 'batch'
+OCR_MODE_MONTAGE = 'montage'
+OCR_MODES = [OCR_MODE_SINGLE, OCR_MODE_BATCH, OCR_MODE_MONTAGE]
+
+MONTAGE_GAP = 20
+
+
+class TesseractRecognizer(DigitRecognizer):
+
+    def __init__(self, ocr_mode=OCR_MODE_SINGLE, show_progress=False, max_digits=1):
+        """
+        :param max_digits: Maximum number of digits per tile, e.g. 2 for 16x16 boards
+        """
+        if ocr_mode not in OCR_MODES:
+            raise ValueError(f'Unknown OCR mode {ocr_mode}. Expected one of {OCR_MODES}')
+        if ocr_mode == OCR_MODE_BATCH and not self.is_batch_available():
+            log.warning('OCR mode batch needs tesserocr, which is not installed. '
+                        'Falling back to one tesseract process per tile')
+            ocr_mode = OCR_MODE_SINGLE
+        self._ocr_mode = ocr_mode
+        self._show_progress = show_progress
+        self._max_digits = max_digits
+        self._config = TESSERACT_CONFIG if max_digits == 1 else TESSERACT_NUMBER_CONFIG
+        self._montage_config = TESSERACT_MONTAGE_CONFIG if max_digits == 1 else TESSERACT_MONTAGE_NUMBER_CONFIG
+        self._tesseract_api = threading.local()
+        # Handles of all threads, they are released by close or once the recognizer is garbage collected
+        self._handles = []
+        self._handles_lock = threading.Lock()
+        self._finalizer = weakref.finalize(self, self._end_handles, self._handles, self._handles_lock)
+
+    @staticmethod
+    def is_batch_available():
+        try:
+            import tesserocr  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    @staticmethod
+    def _end_handles(handles, lock):
+        with lock:
+            for api in handles:
+                api.End()
+            handles.clear()
+
+    def close(self):
+        """
+        Releases the tesseract handles of batch mode, the recognizer creates new ones if it is used again
+        """
+        self._end_handles(self._handles, self._handles_lock)
+        self._tesseract_api = threading.local()
+
+    @staticmethod
+    def parse_cell(text):
+        """
+        Converts the text recognized in a single tile to the value of the cell
+        :param text: Raw OCR output of the tile
+        :return: Number in the cell or 0 if the cell is empty
+        """
+        if text and text not in CHAR_BLACKLIST:
+            try:
+                return int(text)
+            except ValueError:
+                log.warning(f'Unable to parse {repr(text)} to int!')
+        return 0
+
+    def _progress(self, iterable):
+        if self._show_progress:
+            from tqdm import tqdm
+            return tqdm(iterable)
+        return iterable
+
+    def _recognize_single(self, cutouts):
+        """
+        Runs one tesseract process per tile
+        """
+        import pytesseract
+
+        return [pytesseract.image_to_string(cutout, config=self._config) for cutout in self._progress(cutouts)]
+
+    def _get_tesseract_api(self):
+        """
+        Returns a tesseract handle which stays alive between scans. Handles are not thread safe, hence one per thread.
+        """
+        api = getattr(self._tesseract_api, 'handle', None)
+        if api is None:
+            from tesserocr import PyTessBaseAPI, PSM
+
+            if self._max_digits == 1:
+                api = PyTessBaseAPI(psm=PSM.SINGLE_CHAR)
+                api.SetVariable('tessedit_char_whitelist', CHAR_WHITELIST)
+            else:
+                api = PyTessBaseAPI(psm=PSM.SINGLE_WORD)
+                api.SetVariable('tessedit_char_whitelist', NUMBER_WHITELIST)
+            with self._handles_lock:
+                self._handles.append(api)
+            self._tesseract_api.handle = api
+        return api
+
+    def _recognize_batch(self, cutouts):
+        """
+        Recognizes all tiles using one persistent tesseract handle instead of one process per tile.
+        The engine and its settings are the same as in single mode, hence the results per tile are too.
+        """
+        from PIL import Image
+
+        api = self._get_tesseract_api()
+
+        texts = []
+        for cutout in self._progress(cutouts):
+            api.SetImage(Image.fromarray(cutout))
+            texts.append(api.GetUTF8Text())
+        return texts
+
+    @staticmethod
+    def build_montage(cutouts, gap=MONTAGE_GAP):
+        """
+        Stacks all tiles vertically onto one white image, each tile in a slot of equal height
+        :return: The montage and the height of a single slot
+        """
+        height = max(cutout.shape[0] for cutout in cutouts)
+        width = max(cutout.shape[1] for cutout in cutouts)
+        slot_height = height + gap
+        montage = np.full((slot_height * len(cutouts) + gap, width + 2 * gap) + cutouts[0].shape[2:], 255, np.uint8)
+        for i, cutout in enumerate(cutouts):
+            y = gap + i * slot_height
+            montage[y:y + cutout.shape[0], gap:gap + cutout.shape[1]] = cutout
+        return montage, slot_height
+
+    def _recognize_montage(self, cutouts):
+        """
+        Recognizes all tiles with a single tesseract call on a montage of the tiles.
+        Fastest mode, but tesseract sees the tiles in context, so single tiles may be read differently.
+        """
+        import pytesseract
+
+        montage, slot_height = self.build_montage(cutouts)
+        data = pytesseract.image_to_data(montage, config=self._montage_config, output_type=pytesseract.Output.DICT)
+
+        texts = [''] * len(cutouts)
+        for text, top, height in zip(data['text'], data['top'], data['height']):
+            text = text.strip()
+            if not text:
+                continue
+            slot = (top + height // 2 - MONTAGE_GAP // 2) // slot_height
+            if 0 <= slot < len(cutouts):
+                texts[slot] += text
+        return texts
+
+    def recognize(self, cutouts):
+        if not cutouts:
+            return []
+
+        if self._ocr_mode == OCR_MODE_BATCH:
+            texts = self._recognize_batch(cutouts)
+        elif self._ocr_mode == OCR_MODE_MONTAGE:
+            texts = self._recognize_montage(cutouts)
+        else:
+            texts = self._recognize_single(cutouts)
+
+        return [self.parse_cell(text) for text in texts]
@@ -0,0 +1,3 @@
+from .DigitRecognizer import DigitRecognizer
+from .TemplateRecognizer import TemplateRecognizer
+from .TesseractRecognizer import TesseractRecognizer
@@ -0,0 +1,25 @@
+import configparser
+import os
+from functools import lru_cache
+
+CONFIG_FILE_VARIABLE = 'PUZZLE_SOLVER_CONFIG_FILE'
+
+
+@lru_cache(maxsize=None)
+def load_settings(path):
+    """
+    Parses a config file once, later calls return the same object
+    :param path: Path of the config file, None for empty settings
+    :return: ConfigParser, shared by all callers and therefore not to be modified
+    """
+    config = configparser.ConfigParser()
+    if path is not None:
+        config.read(path)
+    return config
+
+
+def get_settings():
+    """
+    :return: Settings of the config file set in PUZZLE_SOLVER_CONFIG_FILE, see load_settings
+    """
+    return load_settings(os.environ.get(CONFIG_FILE_VARIABLE))
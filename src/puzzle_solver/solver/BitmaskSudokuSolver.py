@@ -0,0 +1,182 @@
+import logging
+from functools import lru_cache
+from time import monotonic
+
+from puzzle_solver.models.grid_games import Sudoku
+from puzzle_solver.solver import Solver, SolverResult
+from puzzle_solver.solver.SolverResult import STATUS_OPTIMAL, STATUS_FEASIBLE, STATUS_INFEASIBLE, STATUS_UNKNOWN
+
+log = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def get_units_and_peers(cell_size):
+    """
+    Computes the units (rows, columns and boxes) and the peers of every field of a board
+    :param cell_size: Size of a box, e.g. 3 for a 9x9 Sudoku
+    :return: Tuple of units and tuple of peers per field, fields are given as flat indices
+    """
+    board_size = cell_size * cell_size
+    rows = [tuple(i * board_size + j for j in range(board_size)) for i in range(board_size)]
+    cols = [tuple(i * board_size + j for i in range(board_size)) for j in range(board_size)]
+    boxes = [
+        tuple((bi * cell_size + di) * board_size + bj * cell_size + dj
+              for di in range(cell_size) for dj in range(cell_size))
+        for bi in range(cell_size) for bj in range(cell_size)
+    ]
+    units = tuple(rows + cols + boxes)
+
+    peers = [set() for _ in range(board_size * board_size)]
+    for unit in units:
+        for field in unit:
+            peers[field].update(unit)
+    for field, field_peers in enumerate(peers):
+        field_peers.discard(field)
+    return units, tuple(tuple(sorted(field_peers)) for field_peers in peers)
+
+
+def count_candidates(mask):
+    return bin(mask).count('1')
+
+
+class BitmaskSudokuSolver(Solver):
+    """
+    Exact Sudoku solver written in plain Python.
+    The candidates of every field are kept as bitmask (bit k set if k+1 is possible).
+    Naked and hidden singles are propagated, the remaining fields are solved by backtracking,
+    always branching on the field with the fewest candidates.
+    """
+
+    def __init__(self, time_limit=None):
+        super().__init__()
+        self._time_limit = time_limit
+
+    @staticmethod
+    def propagate(candidates, assigned, pending, units, peers, full):
+        """
+        Applies naked and hidden singles until nothing changes anymore. Modifies candidates and assigned in place.
+        :param pending: Fields with a single candidate which has not yet been removed from their peers
+        :return: False if a contradiction was found
+        """
+        while pending:
+            # Naked singles: a field with a single candidate removes it from all peers
+            while pending:
+                field = pending.pop()
+                if assigned[field]:
+                    continue
+                assigned[field] = True
+                mask = candidates[field]
+                for peer in peers[field]:
+                    if candidates[peer] & mask:
+                        remaining = candidates[peer] & ~mask
+                        if remaining == 0:
+                            return False
+                        candidates[peer] = remaining
+                        if remaining & (remaining - 1) == 0:
+                            pending.append(peer)
+
+            # Hidden singles: a value which fits into only one field of a unit has to be placed there
+            for unit in units:
+                once = 0
+                twice = 0
+                for field in unit:
+                    mask = candidates[field]
+                    twice |= once & mask
+                    once |= mask
+                if once != full:
+                    return False  # Some value cannot be placed anywhere in this unit
+                hidden = once & ~twice
+                if hidden:
+                    for field in unit:
+                        mask = candidates[field] & hidden
+                        if mask and not assigned[field]:
+                            if mask & (mask - 1):
+                                return False  # Two values can only be placed into the same field
+                            candidates[field] = mask
+                            pending.append(field)
+        return True
+
+    def _search(self, candidates, assigned, pending, units, peers, solutions, limit, deadline):
+        """
+        Depth first search collecting all solutions (up to limit) into solutions
+        :return: False if the search has to be stopped
+        """
+        full = (1 << len(units[0])) - 1
+        if not self.propagate(candidates, assigned, pending, units, peers, full):
+            return True
+
+        # Branch on the open field with the fewest candidates
+        best_field = None
+        best_count = len(units[0]) + 1
+        for field, mask in enumerate(candidates):
+            if not assigned[field]:
+                count = count_candidates(mask)
+                if count < best_count:
+                    best_field = field
+                    best_count = count
+                    if count == 2:
+                        break
+
+        if best_field is None:
+            solutions.append([mask.bit_length() for mask in candidates])
+            return limit is None or len(solutions) < limit
+
+        if deadline is not None and monotonic() > deadline:
+            log.warning('Time limit reached, stop search')
+            return False
+
+        mask = candidates[best_field]
+        while mask:
+            bit = mask & -mask
+            mask ^= bit
+            child = candidates.copy()
+            child[best_field] = bit
+            if not self._search(child, assigned.copy(), [best_field], units, peers, solutions, limit, deadline):
+                return False
+        return True
+
+    def initial_candidates(self, game):
+        """
+        Converts the given numbers of the game to bitmasks
+        :return: List of bitmasks or None if the game contains values which are out of range
+        """
+        board_size = game.get_height()
+        full = (1 << board_size) - 1
+        candidates = []
+        for value in game.flatten():
+            value = int(value)
+            if value == 0:
+                candidates.append(full)
+            elif 0 < value <= board_size:
+                candidates.append(1 << (value - 1))
+            else:
+                log.error(f'Only numbers between 0-{board_size} allowed. Got {value} instead')
+                return None
+        return candidates
+
+    def solve(self, game, max_solutions=None):
+        start = monotonic()
+        deadline = start + self._time_limit if self._time_limit else None
+
+        solutions = []
+        completed = True
+        candidates = self.initial_candidates(game)
+        if candidates is not None:
+            units, peers = get_units_and_peers(game.get_cell_size())
+            pending = [field for field, mask in enumerate(candidates) if mask & (mask - 1) == 0]
+            completed = self._search(candidates, [False] * len(candidates), pending, units, peers, solutions,
+                                     max_solutions, deadline)
+
+        log.debug(f'Number of solutions found: {len(solutions)}')
+        if solutions:
+            status = STATUS_OPTIMAL if completed else STATUS_FEASIBLE
+        else:
+            log.error('Unable to solve Sudoku')
+            status = STATUS_INFEASIBLE if completed else STATUS_UNKNOWN
+
+        results = []
+        for solution in solutions:
+            tmp = Sudoku(game.initial_game())
+            tmp.game = Sudoku.from_flat_array(solution).game
+            results.append(tmp)
+        return SolverResult(tuple(results), status, not completed, monotonic() - start)
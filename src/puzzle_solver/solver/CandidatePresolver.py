@@ -0,0 +1,122 @@
+import numpy as np
+
+# Outcomes of a presolve
+OUTCOME_SOLVED = 'solved'  # All fields are known, no search is needed
+OUTCOME_NARROWED = 'narrowed'  # Some fields were filled, the search starts from there
+OUTCOME_UNCHANGED = 'unchanged'  # No field could be filled, at most candidates were removed
+OUTCOME_INFEASIBLE = 'infeasible'  # The given numbers contradict each other
+OUTCOMES = [OUTCOME_SOLVED, OUTCOME_NARROWED, OUTCOME_UNCHANGED, OUTCOME_INFEASIBLE]
+
+
+class CandidatePresolver:
+    """
+    Deduces what follows from the given numbers by logic alone, before a search is started.
+    The candidates are kept as boolean array (row, column, value - 1) and every technique is applied to all fields
+    and values at once, until nothing changes anymore:
+
+    - naked singles: a field with a single candidate is filled with it
+    - hidden singles: a value which fits into only one field of a row, column or box is placed there
+    - pointing pairs: if the candidates of a value in a box lie in one row (column),
+      the value is removed from this row (column) in the other boxes
+    - box-line reduction: if the candidates of a value in a row (column) lie in one box,
+      the value is removed from the other rows (columns) of this box
+
+    All deductions hold for every solution, so the presolved Sudoku has the same solutions as the given one.
+    """
+
+    def __init__(self, cell_size):
+        """
+        :param cell_size: Size of a box, e.g. 3 for a 9x9 Sudoku
+        """
+        self._cell_size = cell_size
+        self._board_size = cell_size * cell_size
+        self._values = np.arange(1, self._board_size + 1)
+
+    def _boxes(self, array):
+        """
+        :return: View of a (row, column, value) array as (box row, row in box, box column, column in box, value)
+        """
+        return array.reshape(self._cell_size, self._cell_size, self._cell_size, self._cell_size, self._board_size)
+
+    def _eliminate_locked(self, candidates):
+        """
+        Applies pointing pairs and box-line reductions, modifies candidates in place
+        """
+        boxes = self._boxes(candidates)
+        rows = boxes.any(axis=3)  # (box row, row in box, box column, value)
+        cols = boxes.any(axis=1)  # (box row, box column, column in box, value)
+
+        # Pointing: the value is locked to one row (column) of a box, the other boxes of this row (column) lose it
+        pointing_rows = rows & (rows.sum(axis=1, keepdims=True) == 1)
+        boxes &= ~(pointing_rows.sum(axis=2, keepdims=True) - pointing_rows > 0)[:, :, :, None, :]
+        pointing_cols = cols & (cols.sum(axis=2, keepdims=True) == 1)
+        boxes &= ~(pointing_cols.sum(axis=0, keepdims=True) - pointing_cols > 0)[:, None, :, :, :]
+
+        # Box-line: the value is locked to one box of a row (column), the other rows (columns) of the box lose it
+        claiming_rows = rows & (rows.sum(axis=2, keepdims=True) == 1)
+        boxes &= ~(claiming_rows.sum(axis=1, keepdims=True) - claiming_rows > 0)[:, :, :, None, :]
+        claiming_cols = cols & (cols.sum(axis=0, keepdims=True) == 1)
+        boxes &= ~(claiming_cols.sum(axis=2, keepdims=True) - claiming_cols > 0)[:, None, :, :, :]
+
+    def _find_singles(self, candidates):
+        """
+        :return: Boolean array (row, column, value - 1) of the naked and hidden singles, None if some field has no
+                 candidate left or some value fits nowhere in a unit
+        """
+        field_counts = candidates.sum(axis=2)
+        row_counts = candidates.sum(axis=1)
+        col_counts = candidates.sum(axis=0)
+        box_counts = self._boxes(candidates).sum(axis=(1, 3))
+        if not (field_counts.all() and row_counts.all() and col_counts.all() and box_counts.all()):
+            return None
+
+        singles = (field_counts == 1)[:, :, None] | (row_counts == 1)[:, None, :] | (col_counts == 1)[None, :, :]
+        self._boxes(singles)[...] |= (box_counts == 1)[:, None, :, None, :]
+        return candidates & singles
+
+    def presolve(self, givens):
+        """
+        :param givens: 2D numpy array of the given numbers, 0 for empty fields
+        :return: Outcome, 2D numpy array of the numbers known after presolving (0 for fields still open) and
+                 boolean array of the remaining candidates (row, column, value - 1). Both arrays are None if the
+                 outcome is OUTCOME_INFEASIBLE.
+        """
+        board_size = self._board_size
+        grid = np.array(givens, dtype=np.int64)
+        if ((grid < 0) | (grid > board_size)).any():
+            return OUTCOME_INFEASIBLE, None, None
+
+        candidates = np.ones((board_size, board_size, board_size), bool)
+        total = np.count_nonzero(candidates)
+        while True:
+            # Placed numbers remove their value from all peers
+            placed = grid[:, :, None] == self._values
+            placed_boxes = self._boxes(placed).sum(axis=(1, 3))
+            if (placed.sum(axis=1) > 1).any() or (placed.sum(axis=0) > 1).any() or (placed_boxes > 1).any():
+                return OUTCOME_INFEASIBLE, None, None
+            candidates &= ~placed.any(axis=1)[:, None, :]
+            candidates &= ~placed.any(axis=0)[None, :, :]
+            self._boxes(candidates)[...] &= ~(placed_boxes > 0)[:, None, :, None, :]
+            filled = grid != 0
+            candidates[filled] = placed[filled]
+
+            self._eliminate_locked(candidates)
+            singles = self._find_singles(candidates)
+            if singles is None:
+                return OUTCOME_INFEASIBLE, None, None
+            singles[filled] = False
+            found = singles.any(axis=2)
+            if (singles.sum(axis=2) > 1).any():
+                return OUTCOME_INFEASIBLE, None, None  # Two values can only be placed into the same field
+            grid[found] = singles[found].argmax(axis=1) + 1
+
+            remaining = np.count_nonzero(candidates)
+            if not found.any() and remaining == total:
+                break
+            total = remaining
+
+        if grid.all():
+            return OUTCOME_SOLVED, grid, candidates
+        if (grid != givens).any():
+            return OUTCOME_NARROWED, grid, candidates
+        return OUTCOME_UNCHANGED, grid, candidates
@@ -1,5 +1,13 @@
 class Solver:
-    game = None
+    """
+    Base class of all solvers. Solvers keep no state between calls of solve, so one instance can be shared by threads.
+    """
 
-    def solve(self, game):
-        self.game = game
+    def solve(self, game, max_solutions=None):
+        """
+        Searches the solutions of the game
+        :param game: Game to solve
+        :param max_solutions: Stop the search after this many solutions, None to search all solutions
+        :return: SolverResult
+        """
+        raise NotImplementedError
@@ -0,0 +1,80 @@
+from dataclasses import dataclass, replace
+from typing import Optional
+
+SEARCH_BRANCHINGS = ['AUTOMATIC_SEARCH', 'FIXED_SEARCH', 'PORTFOLIO_SEARCH', 'LP_SEARCH', 'PSEUDO_COST_SEARCH',
+                     'PORTFOLIO_WITH_QUICK_RESTART_SEARCH']
+
+
+@dataclass(frozen=True)
+class SolverProfile:
+    """
+    Named set of CP-SAT parameters. Unset parameters keep the defaults of CP-SAT.
+    """
+    name: str
+    num_workers: Optional[int] = None
+    presolve: Optional[bool] = None
+    linearization_level: Optional[int] = None
+    search_branching: Optional[str] = None
+
+    def __post_init__(self):
+        if self.search_branching is not None and self.search_branching not in SEARCH_BRANCHINGS:
+            raise ValueError(f'Unknown search branching {self.search_branching} of solver profile {self.name}. '
+                             f'Expected one of {SEARCH_BRANCHINGS}')
+        if self.num_workers is not None and self.num_workers < 1:
+            raise ValueError(f'num_workers of solver profile {self.name} has to be a positive integer')
+
+    @staticmethod
+    def from_config(config, name):
+        """
+        Reads the profile from the section [solver:<name>], keys which are not set are taken from the built-in
+        profile of the same name
+        """
+        profile = PROFILES.get(name, SolverProfile(name))
+        section = f'solver:{name}'
+        if section not in config:
+            return profile
+        return replace(
+            profile,
+            num_workers=config.getint(section, 'num_workers', fallback=profile.num_workers),
+            presolve=config.getboolean(section, 'presolve', fallback=profile.presolve),
+            linearization_level=config.getint(section, 'linearization_level', fallback=profile.linearization_level),
+            search_branching=config.get(section, 'search_branching', fallback=profile.search_branching),
+        )
+
+    @staticmethod
+    def all_from_config(config):
+        """
+        :return: Dictionary of the built-in profiles and all profiles defined in the config, by name
+        """
+        names = list(PROFILES.keys()) + [section.split(':', 1)[1] for section in config.sections()
+                                         if section.startswith('solver:')]
+        return {name: SolverProfile.from_config(config, name) for name in names}
+
+    def is_parallel(self):
+        return self.num_workers is not None and self.num_workers > 1
+
+    def apply(self, parameters):
+        """
+        Sets the parameters of the profile on the SatParameters of a CpSolver
+        """
+        from ortools.sat.python import cp_model
+
+        if self.num_workers is not None:
+            parameters.num_workers = self.num_workers
+        if self.presolve is not None:
+            parameters.cp_model_presolve = self.presolve
+        if self.linearization_level is not None:
+            parameters.linearization_level = self.linearization_level
+        if self.search_branching is not None:
+            parameters.search_branching = getattr(cp_model, self.search_branching)
+
+
+PROFILES = {
+    # Fastest single solve of typical 9x9 Sudokus
+    'latency': SolverProfile('latency', num_workers=1, presolve=True, linearization_level=1),
+    # Least work per solve, for many concurrent requests. Skipping presolve pays off for hard Sudokus.
+    'throughput': SolverProfile('throughput', num_workers=1, presolve=False, linearization_level=0),
+    # Parallel portfolio for hard or large boards
+    'hard': SolverProfile('hard', num_workers=8, presolve=True, linearization_level=2,
+                          search_branching='PORTFOLIO_SEARCH'),
+}
@@ -0,0 +1,32 @@
+from dataclasses import dataclass
+from typing import Tuple
+
+from puzzle_solver.models.grid_games import GridGame
+
+# Same meaning as the statuses of OR-Tools while enumerating all solutions
+STATUS_OPTIMAL = 'OPTIMAL'  # All solutions were found
+STATUS_FEASIBLE = 'FEASIBLE'  # Some solutions were found, but the search stopped early
+STATUS_INFEASIBLE = 'INFEASIBLE'  # There is no solution
+STATUS_UNKNOWN = 'UNKNOWN'  # The search stopped before finding any solution
+
+
+@dataclass(frozen=True)
+class SolverResult:
+    """
+    Immutable outcome of a single solve
+    """
+    solutions: Tuple[GridGame, ...]
+    status: str
+    truncated: bool
+    wall_time: float
+
+    def __post_init__(self):
+        for solution in self.solutions:
+            solution.game.setflags(write=False)
+
+    @property
+    def solution_count(self):
+        return len(self.solutions)
+
+    def is_solved(self):
+        return len(self.solutions) > 0
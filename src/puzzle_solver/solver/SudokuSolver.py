@@ -1,99 +1,309 @@
-import configparser
 import logging
-import os
+from dataclasses import replace
+from functools import lru_cache
 from itertools import product
+from time import monotonic
 
-from ortools.sat.python import cp_model
+import numpy as np
 
+from puzzle_solver import metrics
+from puzzle_solver.metrics import stage_seconds, COUNT_BUCKETS
 from puzzle_solver.models.grid_games import Sudoku
-from puzzle_solver.solver import Solver
-from puzzle_solver.solver.callbacks import GridGameSolutionCallback
+from puzzle_solver.settings import get_settings
+from puzzle_solver.solver import Solver, SolverResult, SolverProfile, BitmaskSudokuSolver, CandidatePresolver
+from puzzle_solver.solver.CandidatePresolver import OUTCOME_SOLVED, OUTCOME_INFEASIBLE
+from puzzle_solver.solver.SolverResult import STATUS_OPTIMAL, STATUS_INFEASIBLE
 
 log = logging.getLogger(__name__)
 
+ENGINE_CP_SAT = 'cp-sat'
+ENGINE_BITMASK = 'bitmask'
+ENGINES = [ENGINE_CP_SAT, ENGINE_BITMASK]
+# Reported as engine of the solves which were finished by the presolve, without starting an engine
+ENGINE_PRESOLVE = 'presolve'
+# Parallel profiles search with all workers up to this many solutions, e.g. to check whether the solution is unique.
+# They enumerate more solutions with a single worker.
+MAX_EXCLUSION_SOLUTIONS = 2
+
+solves = metrics.registry.counter('puzzle_solver_solves_total', 'Number of solves by engine and status',
+                                  ['engine', 'status'])
+solution_counts = metrics.registry.histogram('puzzle_solver_solutions', 'Number of solutions found per solve',
+                                             ['engine'], COUNT_BUCKETS)
+branches = metrics.registry.histogram('puzzle_solver_solver_branches', 'Number of branches of the CP-SAT search',
+                                      buckets=COUNT_BUCKETS)
+conflicts = metrics.registry.histogram('puzzle_solver_solver_conflicts', 'Number of conflicts of the CP-SAT search',
+                                       buckets=COUNT_BUCKETS)
+presolves = metrics.registry.counter('puzzle_solver_presolves_total', 'Number of candidate presolves by outcome',
+                                     ['outcome'])
+presolve_fields = metrics.registry.histogram('puzzle_solver_presolve_filled_fields',
+                                             'Number of fields filled by the candidate presolve', buckets=COUNT_BUCKETS)
+
+
+@lru_cache(maxsize=None)
+def get_structural_model(cell_size):
+    """
+    Builds the variables and constraints shared by all Sudokus of a board size, the variable of field (i, j)
+    has the index i * board_size + j. The model must not be modified, solves work on a clone.
+    :param cell_size: Size of a box, e.g. 3 for a 9x9 Sudoku
+    """
+    from ortools.sat.python import cp_model
+
+    model = cp_model.CpModel()
+    board = SudokuSolver.configure_board(model, cell_size)
+    SudokuSolver.add_constraints(model, board, cell_size)
+    return model
+
+
+def get_domains(candidates):
+    """
+    :param candidates: Boolean array (field, value - 1), True if the value is possible in the field
+    :return: Domain of the possible values per field as flat list of closed intervals, e.g. [1, 3, 5, 5] for 1, 2, 3
+             and 5
+    """
+    padded = np.pad(candidates, ((0, 0), (1, 1)))
+    fields, starts = np.nonzero(padded[:, 1:-1] & ~padded[:, :-2])
+    ends = np.nonzero(padded[:, 1:-1] & ~padded[:, 2:])[1]
+    bounds = np.column_stack([starts + 1, ends + 1]).ravel().tolist()
+    offsets = np.r_[0, np.cumsum(2 * np.bincount(fields, minlength=len(candidates)))].tolist()
+    return [bounds[offsets[i]:offsets[i + 1]] for i in range(len(candidates))]
+
 
 class SudokuSolver(Solver):
-    game = None
-    _solutions = []
 
-    def __init__(self):
+    def __init__(self, engine=None, profile=None, presolve=None):
+        """
+        :param engine: Solver engine, defaults to [solver] engine
+        :param profile: Default solver profile, defaults to [solver] profile
+        :param presolve: Whether to run the candidate presolve before CP-SAT, defaults to [solver] candidate_presolve
+        """
         super().__init__()
-        self._config = configparser.ConfigParser()
-        self._config.read(os.environ.get('PUZZLE_SOLVER_CONFIG_FILE'))
-
-    def stringify(self, game: Sudoku):
-        arr = []
-        for row in game.game:
-            r = []
-            for value in row:
-                if value == 0:
-                    r.append('')
-                else:
-                    try:
-                        r.append(str(value))
-                    except ValueError:
-                        raise ValueError(f'Only numbers between 0-9 allowed. Got {value} instead')
-            arr.append(r)
-        return arr
-
-    def configure_board(self, model):
-        cell_size = self.game.get_cell_size()
+        self._config = get_settings()
+        self._engine = engine or self._config.get('solver', 'engine', fallback=ENGINE_CP_SAT)
+        if self._engine not in ENGINES:
+            raise ValueError(f'Unknown solver engine {self._engine}. Expected one of {ENGINES}')
+        self._max_solutions = self._config.getint('solver', 'max_solutions', fallback=0) or None
+        self._presolve = self._config.getboolean('solver', 'candidate_presolve', fallback=True) \
+            if presolve is None else presolve
+        self._profiles = SolverProfile.all_from_config(self._config)
+        self._profile = None
+        self._profile = self.get_profile(profile or self._config.get('solver', 'profile', fallback=None))
+
+    def get_profile(self, name=None):
+        """
+        :param name: Name of a built-in profile or of a profile defined in the config, None for the default profile
+        :return: SolverProfile or None if the defaults of CP-SAT are used
+        """
+        if name is None:
+            return self._profile
+        if name not in self._profiles:
+            raise ValueError(f'Unknown solver profile {name}. Expected one of {list(self._profiles.keys())}')
+        return self._profiles[name]
+
+    @staticmethod
+    def configure_board(model, cell_size):
         board_size = cell_size * cell_size
-        board_indices = list(product(range(board_size), repeat=2))  # tuples (i, j) for all board indices
-        cell_indices = list(product(range(cell_size), repeat=2))  # tuples (i, j) for all cell indices
         board = [
             [model.NewIntVar(1, board_size, f"({_i},{_j})") for _j in range(board_size)]
             for _i in range(board_size)
         ]
+        return board
 
-        return board_indices, cell_indices, board
-
-    def add_constraints(self, model, board, board_indices, cell_indices, game):
-        game_representation = self.stringify(game)
-
-        # Assign existing numbers
-        for i, j in board_indices:
-            if len(game_representation[i][j]) > 0:  # elements are strings, so check for length
-                model.Add(board[i][j] == int(game_representation[i][j]))  # and cast back to int
-
+    @staticmethod
+    def add_constraints(model, board, cell_size):
         # All lines and columns have to be different
-        board_size = game.get_height()
+        board_size = cell_size * cell_size
         for i in range(board_size):
             model.AddAllDifferent([board[i][j] for j in range(board_size)])  # rows
             model.AddAllDifferent([board[j][i] for j in range(board_size)])  # columns
 
-        # All 3x3 sub-matrix contains only different values
-        cell_size = game.get_cell_size()
-        for i, j in cell_indices:
+        # All boxes (e.g. 3x3 for 9x9 boards) contain only different values
+        for i, j in product(range(cell_size), repeat=2):
             model.AddAllDifferent(
                 [board[i * cell_size + di][j * cell_size + dj] for di in range(cell_size) for dj in range(cell_size)]
             )
 
-    def solve(self, game):
-        self.game = game
-        model = cp_model.CpModel()
-        board_indices, cell_indices, board = self.configure_board(model)
-        self.add_constraints(model, board, board_indices, cell_indices, self.game)
+    @staticmethod
+    def create_model(game, candidates=None):
+        """
+        Copies the structural model of the board size and fixes the given numbers by restricting the domains
+        :param candidates: Boolean array (row, column, value - 1) of the candidates found by the presolve, restricts
+                           the domains of all fields to their candidates
+        :return: Model and 2D list of the variables of the board, None if the game contains values out of range
+        """
+        board_size = game.get_height()
+        givens = game.flatten()
+        out_of_range = (givens < 0) | (givens > board_size)
+        if out_of_range.any():
+            log.error(f'Only numbers between 0-{board_size} allowed. Got {givens[out_of_range]}')
+            return None, None
+
+        model = get_structural_model(game.get_cell_size()).Clone()
+        variables = model.Proto().variables
+        if candidates is not None:
+            candidates = candidates.reshape(len(givens), board_size)
+            narrowed = np.flatnonzero(~candidates.all(axis=1))
+            for index, domain in zip(narrowed.tolist(), get_domains(candidates[narrowed])):
+                variables[index].domain.clear()
+                variables[index].domain.extend(domain)
+        else:
+            for index in givens.nonzero()[0]:
+                value = int(givens[index])
+                variables[index].domain[0] = value
+                variables[index].domain[1] = value
+
+        board = [
+            [model.GetIntVarFromProtoIndex(i * board_size + j) for j in range(board_size)]
+            for i in range(board_size)
+        ]
+        return model, board
+
+    def solve(self, game, max_solutions=None, profile=None, time_limit=None):
+        """
+        Searches the solutions of the Sudoku. Safe to be called from multiple threads at once.
+        :param game: Sudoku to solve
+        :param max_solutions: Stop the search after this many solutions, e.g. 2 to check whether the solution is unique.
+                              Defaults to [solver] max_solutions, the search is unbounded if neither is set.
+        :param profile: Name of the solver profile to use, defaults to [solver] profile. Ignored by the bitmask engine.
+        :param time_limit: Time limit in seconds, defaults to [solver] time_limit
+        :return: SolverResult
+        """
+        if max_solutions is None:
+            max_solutions = self._max_solutions
+        profile = self.get_profile(profile)
+        time_limit = time_limit or self._config.getfloat('solver', 'time_limit', fallback=0) or None
+
+        engine = self._engine
+        with stage_seconds.time(stage='solve'):
+            if self._engine == ENGINE_BITMASK:
+                # Propagates singles faster by itself than the presolve takes
+                result = BitmaskSudokuSolver(time_limit).solve(game, max_solutions)
+            else:
+                start = monotonic()
+                outcome, grid, candidates = self.presolve(game) if self._presolve else (None, None, None)
+                if outcome == OUTCOME_SOLVED:
+                    # Logic alone leaves a single value per field, so this is the only solution
+                    solution = Sudoku(game.initial_game())
+                    solution.game = grid
+                    result = SolverResult((solution,), STATUS_OPTIMAL, False, monotonic() - start)
+                    engine = ENGINE_PRESOLVE
+                elif outcome == OUTCOME_INFEASIBLE:
+                    log.error('Unable to solve Sudoku')
+                    result = SolverResult((), STATUS_INFEASIBLE, False, monotonic() - start)
+                    engine = ENGINE_PRESOLVE
+                else:
+                    result = replace(self._solve_cp_sat(game, max_solutions, profile, time_limit, candidates),
+                                     wall_time=monotonic() - start)
+
+        solves.inc(engine=engine, status=result.status)
+        solution_counts.observe(result.solution_count, engine=engine)
+        return result
+
+    @staticmethod
+    def presolve(game):
+        """
+        Runs the candidate presolve and records its outcome
+        :return: Outcome, numbers and candidates, see CandidatePresolver.presolve
+        """
+        with stage_seconds.time(stage='presolve'):
+            outcome, grid, candidates = CandidatePresolver(game.get_cell_size()).presolve(game.game)
+        presolves.inc(outcome=outcome)
+        if grid is not None:
+            presolve_fields.observe(int(np.count_nonzero(grid != game.game)))
+        log.debug(f'Presolve outcome: {outcome}')
+        return outcome, grid, candidates
+
+    def _solve_cp_sat(self, game, max_solutions, profile, time_limit, candidates=None):
+        # OR-Tools takes a while to import and is not needed by the bitmask engine
+        from ortools.sat.python import cp_model
+        from puzzle_solver.solver.callbacks import GridGameSolutionCallback
+
+        start = monotonic()
+        model, board = self.create_model(game, candidates)
+        if model is None:
+            return SolverResult((), STATUS_INFEASIBLE, False, monotonic() - start)
 
         solver = cp_model.CpSolver()
-        solver.parameters.max_time_in_seconds = self._config['solver'].getfloat('time_limit')
-        solver.parameters.enumerate_all_solutions = True
-        solution_callback = GridGameSolutionCallback(board, Sudoku)
-        status = solver.Solve(model, solution_callback)
-
-        log.debug(f'Solver status = {solver.StatusName(status)}')
-        log.debug(f'Number of solutions found: {solution_callback.solution_count()}')
-
-        if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
-            self._solutions = solution_callback.solutions()
-            for i, solution in enumerate(self._solutions):
-                tmp = Sudoku(game.initial_game())
-                tmp.game = solution.game
-                self._solutions[i] = tmp
-            return self._solutions
+        if time_limit is not None:
+            solver.parameters.max_time_in_seconds = time_limit
+        parallel = profile is not None and profile.is_parallel()
+        # Excluding solutions one by one restarts the search every time, so parallel profiles are only used for a few
+        # solutions. More solutions are enumerated by a single worker with the defaults of CP-SAT, which is much faster.
+        exclusion = parallel and max_solutions is not None and max_solutions <= MAX_EXCLUSION_SOLUTIONS
+        if profile is not None and (exclusion or not parallel):
+            profile.apply(solver.parameters)
+        elif parallel:
+            solver.parameters.num_workers = 1
+
+        if exclusion:
+            # CP-SAT reports duplicates when enumerating with several workers, so exclude each solution and solve again
+            solutions, status_name, truncated, branch_count, conflict_count = \
+                self._solve_by_exclusion(model, solver, board, game, max_solutions)
         else:
+            solver.parameters.enumerate_all_solutions = True
+            solution_callback = GridGameSolutionCallback(board, Sudoku, max_solutions)
+            status = solver.Solve(model, solution_callback)
+            solutions = [solution.game for solution in solution_callback.solutions()]
+            status_name = solver.StatusName(status)
+            # While enumerating, OPTIMAL means all solutions were found and FEASIBLE that the search was stopped early
+            truncated = status not in [cp_model.OPTIMAL, cp_model.INFEASIBLE]
+            branch_count, conflict_count = solver.NumBranches(), solver.NumConflicts()
+
+        log.debug(f'Solver status = {status_name}')
+        log.debug(f'Number of solutions found: {len(solutions)}')
+        branches.observe(branch_count)
+        conflicts.observe(conflict_count)
+
+        results = []
+        for solution in solutions:
+            tmp = Sudoku(game.initial_game())
+            tmp.game = solution
+            results.append(tmp)
+        if not results:
             log.error('Unable to solve Sudoku')
-            return None
 
-    def get_solutions(self):
-        return self._solutions
+        return SolverResult(tuple(results), status_name, truncated, monotonic() - start)
+
+    @staticmethod
+    def _solve_by_exclusion(model, solver, board, game, max_solutions):
+        """
+        Finds the solutions one by one, forbidding all previous solutions in the model before solving again
+        :return: List of solutions as numpy arrays, status name, whether the search was stopped early and the number
+                 of branches and conflicts of all searches
+        """
+        from ortools.sat.python import cp_model
+
+        time_limit = solver.parameters.max_time_in_seconds
+        deadline = monotonic() + time_limit
+        open_fields = [(i, j) for i, j in zip(*(game.game == 0).nonzero())]
+        solutions = []
+        branch_count, conflict_count = 0, 0
+        while True:
+            status = solver.Solve(model)
+            branch_count += solver.NumBranches()
+            conflict_count += solver.NumConflicts()
+            if status not in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
+                break
+            solution = np.array([[solver.Value(variable) for variable in row] for row in board])
+            solutions.append(solution)
+            if max_solutions is not None and len(solutions) >= max_solutions:
+                log.debug(f'Stop search after {max_solutions} solutions')
+                return solutions, solver.StatusName(cp_model.FEASIBLE), True, branch_count, conflict_count
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                status = cp_model.UNKNOWN
+                break
+            solver.parameters.max_time_in_seconds = remaining
+
+            # At least one open field has to differ from this solution
+            differs = []
+            for i, j in open_fields:
+                differ = model.NewBoolVar(f'differs({i},{j})')
+                model.Add(board[i][j] != int(solution[i][j])).OnlyEnforceIf(differ)
+                differs.append(differ)
+            model.AddBoolOr(differs)
+
+        if status == cp_model.INFEASIBLE:
+            status_name, truncated = solver.StatusName(cp_model.OPTIMAL if solutions else cp_model.INFEASIBLE), False
+        else:
+            status_name, truncated = solver.StatusName(cp_model.FEASIBLE if solutions else cp_model.UNKNOWN), True
+        return solutions, status_name, truncated, branch_count, conflict_count
@@ -1,2 +1,6 @@
 from .Solver import Solver
+from .SolverResult import SolverResult
+from .SolverProfile import SolverProfile
+from .BitmaskSudokuSolver import BitmaskSudokuSolver
+from .CandidatePresolver import CandidatePresolver
 from .SudokuSolver import SudokuSolver
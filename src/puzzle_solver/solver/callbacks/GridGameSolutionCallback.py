@@ -1,16 +1,19 @@
+import logging
+
 from ortools.sat.python import cp_model
 
 from puzzle_solver.models.grid_games import GridGame
 
+log = logging.getLogger(__name__)
+
 
 class GridGameSolutionCallback(cp_model.CpSolverSolutionCallback):
     """Print intermediate solutions."""
 
-    _solutions = []
-
     def __init__(self, variables, game_type=GridGame, limit=None):
         cp_model.CpSolverSolutionCallback.__init__(self)
         self._variables = variables
+        self._solutions = []
         self._solution_count = 0
         self._game_type = game_type
         self._solution_limit = limit
@@ -27,7 +30,7 @@ class GridGameSolutionCallback(cp_model.CpSolverSolutionCallback):
         self._solutions.append(self._game_type.from_flat_array(solution))
 
         if self._solution_limit is not None and self._solution_count >= self._solution_limit:
-            print('Stop search after %i solutions' % self._solution_limit)
+            log.debug('Stop search after %i solutions' % self._solution_limit)
             self.StopSearch()
 
     def solutions(self):
@@ -0,0 +1,151 @@
+"""
+Builds the templates of the TemplateRecognizer from labeled Sudoku images and synthetically rendered digits.
+
+Usage (from the repository root):
+    PYTHONPATH=src python src/scripts/build_digit_templates.py
+    PYTHONPATH=src python src/scripts/build_digit_templates.py --validate
+
+With --validate no templates are written. Instead every labeled image is recognized with templates built without it
+(leave-one-out), so the accuracy is measured on images the templates have not seen.
+"""
+import argparse
+import json
+import logging as log
+import os
+import tempfile
+
+import cv2
+import numpy as np
+
+from puzzle_solver.scanners import GridGameScanner, SudokuScanner
+from puzzle_solver.scanners.recognizers import TemplateRecognizer
+from puzzle_solver.scanners.recognizers.TemplateRecognizer import DEFAULT_TEMPLATE_FILE
+
+ROOT = os.path.join(os.path.dirname(__file__), '..', '..')
+IMAGE_DIR = os.path.join(ROOT, 'PoC', 'img')
+LABEL_FILE = os.path.join(IMAGE_DIR, 'labels.json')
+
+FONTS = [
+    cv2.FONT_HERSHEY_SIMPLEX,
+    cv2.FONT_HERSHEY_PLAIN,
+    cv2.FONT_HERSHEY_DUPLEX,
+    cv2.FONT_HERSHEY_COMPLEX,
+    cv2.FONT_HERSHEY_TRIPLEX,
+]
+THICKNESSES = [1, 2, 3, 4]
+
+
+def load_command_line_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-l", "--labels", default=LABEL_FILE, help="json file mapping image names to their digits")
+    parser.add_argument("-o", "--output", default=DEFAULT_TEMPLATE_FILE, help="file to write the templates to")
+    parser.add_argument("--no-synthetic", action="store_true", help="only use the labeled images")
+    parser.add_argument("--validate", action="store_true", help="measure the accuracy on held out images instead")
+    return parser.parse_args()
+
+
+def load_labels(label_file):
+    """
+    :return: Digits by image name, sorted by name so the templates do not depend on the order of the file
+    """
+    with open(label_file) as f:
+        return dict(sorted(json.load(f).items()))
+
+
+def cut_out_image(image_dir, name, digits):
+    """
+    :return: Binary tiles of the labeled image and the digit of each tile, 0 for empty tiles
+    """
+    image = cv2.imread(os.path.join(image_dir, name), cv2.IMREAD_GRAYSCALE)
+    assert image is not None, f'Error opening image {name}'
+
+    warped, tiles = GridGameScanner().scan(image)
+    binary = SudokuScanner.convert_to_binary_image(warped)
+    cutouts = SudokuScanner.cut_out_tiles(binary, tiles)
+    digits = np.array(digits).flatten()
+    assert len(cutouts) == len(digits), f'Found {len(cutouts)} tiles in {name}, but {len(digits)} labels'
+    return cutouts, digits
+
+
+def templates_from_images(image_dir, image_labels):
+    templates, labels = [], []
+    for name, digits in image_labels.items():
+        cutouts, digits = cut_out_image(image_dir, name, digits)
+        found = 0
+        for cutout, digit in zip(cutouts, digits):
+            template = TemplateRecognizer.extract_digit(cutout)
+            if digit != 0 and template is not None:
+                templates.append(template)
+                labels.append(digit)
+                found += 1
+        log.info(f'{name}: extracted {found} of {np.count_nonzero(digits)} digits')
+    return templates, labels
+
+
+def synthetic_templates(tile_size=64):
+    templates, labels = [], []
+    # Zeros only appear in numbers of larger boards, e.g. 10 on a 16x16 board
+    for digit in range(0, 10):
+        for font in FONTS:
+            for thickness in THICKNESSES:
+                tile = np.full((tile_size, tile_size), 255, np.uint8)
+                scale = cv2.getFontScaleFromHeight(font, tile_size // 2, thickness)
+                (width, height), _ = cv2.getTextSize(str(digit), font, scale, thickness)
+                origin = ((tile_size - width) // 2, (tile_size + height) // 2)
+                cv2.putText(tile, str(digit), origin, font, scale, 0, thickness)
+                template = TemplateRecognizer.extract_digit(tile)
+                if template is not None:
+                    templates.append(template)
+                    labels.append(digit)
+    log.info(f'Rendered {len(templates)} synthetic digits')
+    return templates, labels
+
+
+def build_templates(image_dir, image_labels, synthetic=True):
+    templates, labels = templates_from_images(image_dir, image_labels)
+    if synthetic:
+        synthetic, synthetic_labels = synthetic_templates()
+        templates += synthetic
+        labels += synthetic_labels
+    return templates, labels
+
+
+def write_templates(output, templates, labels):
+    np.savez_compressed(output, templates=np.stack(templates), labels=np.array(labels, np.uint8))
+
+
+def validate(image_dir, image_labels, synthetic=True):
+    """
+    Recognizes every labeled image with templates built from the other images and logs the wrongly read tiles
+    :return: Number of wrongly read tiles and number of tiles
+    """
+    errors, total = 0, 0
+    with tempfile.TemporaryDirectory() as directory:
+        template_file = os.path.join(directory, 'templates.npz')
+        for name, digits in image_labels.items():
+            others = {other: labels for other, labels in image_labels.items() if other != name}
+            write_templates(template_file, *build_templates(image_dir, others, synthetic))
+            cutouts, digits = cut_out_image(image_dir, name, digits)
+            recognized = np.array(TemplateRecognizer(template_file).recognize(cutouts))
+            wrong = np.flatnonzero(recognized != digits)
+            log.info(f'{name}: {len(wrong)} of {len(digits)} tiles read wrongly'
+                     + ''.join(f', expected {digits[i]} got {recognized[i]}' for i in wrong))
+            errors += len(wrong)
+            total += len(digits)
+    return errors, total
+
+
+if __name__ == '__main__':
+    log.basicConfig(level=log.INFO)
+    args = load_command_line_arguments()
+    image_dir = os.path.dirname(args.labels)
+    image_labels = load_labels(args.labels)
+
+    if args.validate:
+        errors, total = validate(image_dir, image_labels, not args.no_synthetic)
+        log.info(f'Held out images: {errors} of {total} tiles read wrongly')
+    else:
+        templates, labels = build_templates(image_dir, image_labels, not args.no_synthetic)
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+        write_templates(args.output, templates, labels)
+        log.info(f'Wrote {len(templates)} templates to {args.output}')
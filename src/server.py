@@ -1,15 +1,15 @@
 import argparse
-import configparser
 import logging as log
 import os
 import sys
 
 from flask import Flask
-from pytesseract import pytesseract
-from waitress import serve
+
+from puzzle_solver.settings import get_settings, CONFIG_FILE_VARIABLE
 
 CONFIG_DEV_FILE = 'src/resources/config-dev.ini'
 CONFIG_PROD_FILE = 'src/resources/config-prod.ini'
+DEFAULT_MAX_UPLOAD_SIZE = 20 * 1024 * 1024
 
 
 def configure_logger(level=log.INFO):
@@ -24,6 +24,8 @@ def load_command_line_arguments():
     parser = argparse.ArgumentParser()
     parser.add_argument("-d", "--dev", action="store_true", help="run in dev mode")
     parser.add_argument("-p", "--prod", action="store_true", help="run in prod mode")
+    parser.add_argument("-w", "--warmup", action="store_true",
+                        help="scan and solve a synthetic Sudoku before accepting requests")
     args = parser.parse_args()
 
     if args.dev and args.prod:
@@ -45,11 +47,10 @@ def load_environment(args):
     else:
         raise EnvironmentError('Running mode unknown. Define either dev or prod.')
 
-    os.environ['PUZZLE_SOLVER_CONFIG_FILE'] = config_file
+    os.environ[CONFIG_FILE_VARIABLE] = config_file
     if not os.path.exists(config_file):
         log.error(f'{config_file} does not exist')
-    config = configparser.ConfigParser()
-    config.read(config_file)
+    config = get_settings()
     log.debug(config.items())
     if 'general' not in config:
         log.error('Config file is not properly configured')
@@ -58,17 +59,29 @@ def load_environment(args):
 
 def load_tesseract(args):
     if args.dev:
+        from pytesseract import pytesseract
         pytesseract.tesseract_cmd = config['tesseract']['executable']  # needed if not running inside docker
 
 
-def create_app():
+def create_app(warmup=False):
+    """
+    :param warmup: Scan, solve and render a synthetic Sudoku before returning, so the first request is not slower
+    """
     # Load app modules locally to ensure that the configuration and environment variables are set up
     from api.controllers import grid_game_controller
+    from api.controllers.GridGameController import sudoku_service
 
     app = Flask(__name__)
 
+    # Larger requests are rejected with 413 before they are read
+    config = get_settings()
+    app.config['MAX_CONTENT_LENGTH'] = config.getint('upload', 'max_size', fallback=DEFAULT_MAX_UPLOAD_SIZE) or None
+
     app.register_blueprint(grid_game_controller)
 
+    if warmup:
+        sudoku_service.warm_up()
+
     return app
 
 
@@ -90,12 +103,15 @@ if __name__ == '__main__':
         log.debug('Running in productive mode')
 
     log.info("Start Server...")
-    app = create_app()
+    app = create_app(args.warmup)
 
     ip_address = config['flask']['ip_address']
     port = config['flask'].getint('port')
 
     if args.prod:
-        serve(app, host=ip_address, port=port)
+        from waitress import serve
+
+        threads = config.getint('flask', 'threads', fallback=4)
+        serve(app, host=ip_address, port=port, threads=threads)
     else:
         app.run(host=ip_address, port=port, debug=debug)
@@ -0,0 +1,290 @@
+"""
+Reproducible benchmark of the request pipeline. Every stage is timed separately:
+
+- scan: GridGameScanner.scan (contours, perspective transformation, lines, tiles), also on 12MP upscaled photos
+  and with board detection on a downscaled copy (pyramid/...), also using the grid tiling (grid/...)
+- corners: GridGameScanner corner detection per corner method on the contours of 12MP upscaled photos
+- ocr: SudokuScanner.find_numbers_in_tiled_image
+- solve: SudokuSolver.solve per engine and difficulty
+- render: Sudoku.to_image
+- zip: ImageMapper.from_images, encoding in the calling thread and in a thread pool (threads/...)
+- request: full requests using the Flask test client
+
+Results can be written as JSON and compared against a previous run to detect regressions.
+
+Usage (from src/test):
+    PYTHONPATH=.. python benchmark.py --output results.json
+    PYTHONPATH=.. python benchmark.py --baseline results.json
+"""
+import argparse
+import json
+import logging as log
+import os
+import platform
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from io import BytesIO
+from time import perf_counter
+
+import cv2
+import numpy as np
+
+from benchmark_solver import load_sudokus
+
+CONFIG_DEV_FILE = '../resources/config-dev.ini'
+IMAGE_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'PoC', 'img')
+PERCENTILES = [50, 90, 99]
+LARGE_IMAGE_PIXELS = 12_000_000  # Typical phone camera
+ZIP_THREADS = 4
+
+STAGES = {}
+
+
+def stage(name):
+    """
+    Registers a stage. A stage returns a list of (case, function) tuples, each function is timed separately.
+    """
+    def register(function):
+        STAGES[name] = function
+        return function
+    return register
+
+
+def load_command_line_arguments():
+    parser = argparse.ArgumentParser(description='Benchmarks the stages of the request pipeline')
+    parser.add_argument("-c", "--config", default=CONFIG_DEV_FILE, help="config file to use")
+    parser.add_argument("-s", "--stages", nargs='+', choices=list(STAGES.keys()), help="stages to run, default all")
+    parser.add_argument("-r", "--repeat", type=int, default=20, help="timed runs per case")
+    parser.add_argument("-w", "--warmup", type=int, default=2, help="untimed runs per case before measuring")
+    parser.add_argument("-o", "--output", help="write the results to this JSON file")
+    parser.add_argument("-b", "--baseline", help="JSON file of a previous run to compare against")
+    parser.add_argument("-t", "--threshold", type=float, default=0.2,
+                        help="relative slowdown of the median which counts as regression")
+    return parser.parse_args()
+
+
+def load_images(large=False):
+    """
+    :param large: Also return the images upscaled to LARGE_IMAGE_PIXELS, named <name>@12MP
+    """
+    images = {}
+    for name in sorted(os.listdir(IMAGE_DIR)):
+        image = cv2.imread(os.path.join(IMAGE_DIR, name), cv2.IMREAD_GRAYSCALE)
+        if image is not None:
+            images[name] = image
+            if large:
+                scale = (LARGE_IMAGE_PIXELS / image.size) ** 0.5
+                images[f'{name}@12MP'] = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+    return images
+
+
+def solved_sudokus():
+    from puzzle_solver.solver import SudokuSolver
+
+    solver = SudokuSolver()
+    return {difficulty: solver.solve(sudokus[0]).solutions[0] for difficulty, sudokus in load_sudokus().items()}
+
+
+@stage('scan')
+def scan_cases():
+    from puzzle_solver.scanners import GridGameScanner
+
+    scanner = GridGameScanner()
+    pyramid_scanner = GridGameScanner(detection_size=1000, warp_size=450)
+    grid_scanner = GridGameScanner(detection_size=1000, warp_size=450, tiling='grid', grid_size=9)
+    cases = []
+    for name, image in load_images(large=True).items():
+        cases.append((name, lambda image=image: scanner.scan(image)))
+        cases.append((f'pyramid/{name}', lambda image=image: pyramid_scanner.scan(image)))
+        cases.append((f'grid/{name}', lambda image=image: grid_scanner.scan(image)))
+    return cases
+
+
+@stage('corners')
+def corner_cases():
+    from puzzle_solver.scanners import GridGameScanner
+
+    cases = []
+    for name, image in load_images(large=True).items():
+        if not name.endswith('@12MP'):
+            continue
+        image = GridGameScanner.add_border_to_image(image, 10)
+        contour = GridGameScanner.find_biggest_contour(image)
+        compressed = GridGameScanner.find_biggest_contour(image, approximation=cv2.CHAIN_APPROX_SIMPLE)
+        cases.append((f'nearest/{name}', lambda contour=contour: GridGameScanner.get_corners_of_contour(contour)))
+        cases.append((f'approx/{name}', lambda contour=compressed: GridGameScanner.get_corners_of_polygon(contour)))
+    return cases
+
+
+@stage('ocr')
+def ocr_cases():
+    from puzzle_solver.scanners import GridGameScanner, SudokuScanner
+
+    scanner = SudokuScanner()
+    cases = []
+    for name, image in load_images().items():
+        warped, tiles = GridGameScanner.scan(scanner, image)
+        binary = cv2.cvtColor(scanner.convert_to_binary_image(warped), cv2.COLOR_GRAY2RGB)
+        cases.append((name, lambda binary=binary, tiles=tiles: scanner.find_numbers_in_tiled_image(binary, tiles)))
+    return cases
+
+
+@stage('solve')
+def solve_cases():
+    from puzzle_solver.solver import SudokuSolver
+    from puzzle_solver.solver.SudokuSolver import ENGINES
+
+    cases = []
+    for engine in ENGINES:
+        solver = SudokuSolver(engine)
+        for difficulty, sudokus in load_sudokus().items():
+            for i, sudoku in enumerate(sudokus):
+                cases.append((f'{engine}/{difficulty}/{i}', lambda solver=solver, sudoku=sudoku: solver.solve(sudoku)))
+    return cases
+
+
+@stage('render')
+def render_cases():
+    return [(difficulty, solution.to_image) for difficulty, solution in solved_sudokus().items()]
+
+
+@stage('zip')
+def zip_cases():
+    from api.mappers import ImageMapper
+
+    images = [solution.to_image() for solution in solved_sudokus().values()]
+    executor = ThreadPoolExecutor(ZIP_THREADS)
+    cases = []
+    for count in [1, 10, 100]:
+        cases.append((f'{count}_images', lambda count=count: b''.join(ImageMapper.from_images(images[:1] * count))))
+        cases.append((f'threads/{count}_images', lambda count=count: b''.join(
+            ImageMapper.from_images(images[:1] * count, executor, 2 * ZIP_THREADS))))
+    return cases
+
+
+@stage('request')
+def request_cases():
+    from server import create_app
+
+    client = create_app().test_client()
+
+    def post(path, **kwargs):
+        response = client.post(path, **kwargs)
+        assert response.status_code == 200, f'{path} returned {response.status_code}'
+        return response
+
+    cases = []
+    for difficulty, sudokus in load_sudokus().items():
+        sudoku = sudokus[0].flatten().tolist()
+        for response_format in ['json', 'zip']:
+            cases.append((f'sudoku/{difficulty}/{response_format}',
+                          lambda sudoku=sudoku, response_format=response_format:
+                          post('/sudoku', json={'sudoku': sudoku, 'format': response_format})))
+    for name in load_images():
+        with open(os.path.join(IMAGE_DIR, name), 'rb') as f:
+            data = f.read()
+        cases.append((f'sudoku/image/{name}', lambda data=data: post(
+            '/sudoku/image', data={'image': (BytesIO(data), name)}, content_type='multipart/form-data')))
+    return cases
+
+
+def measure(function, repeat, warmup):
+    for _ in range(warmup):
+        function()
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        timings.append((perf_counter() - start) * 1000)
+    timings = np.array(timings)
+    result = {'runs': repeat, 'mean_ms': float(timings.mean()), 'min_ms': float(timings.min()),
+              'max_ms': float(timings.max())}
+    for percentile in PERCENTILES:
+        result[f'p{percentile}_ms'] = float(np.percentile(timings, percentile))
+    return result
+
+
+def run(stages, repeat, warmup):
+    """
+    :return: Results by case and the errors of the stages and cases which failed
+    """
+    results, failures = {}, {}
+    for name in stages:
+        try:
+            cases = STAGES[name]()
+        except Exception as e:
+            log.error(f'Stage {name} failed: {e!r}')
+            failures[name] = repr(e)
+            continue
+        for case, function in cases:
+            key = f'{name}/{case}'
+            try:
+                results[key] = measure(function, repeat, warmup)
+            except Exception as e:
+                log.error(f'{key} failed: {e!r}')
+                failures[key] = repr(e)
+                continue
+            print(f'{key:<40} ' + ' '.join(f'p{p}={results[key][f"p{p}_ms"]:>9.2f}ms' for p in PERCENTILES))
+    return results, failures
+
+
+def compare(results, baseline, threshold, stages):
+    """
+    Compares the medians against a previous run
+    :param stages: Stages which were run, cases of the baseline from other stages are not compared
+    :return: List of cases which got slower by more than the threshold or are missing from the results
+    """
+    regressions = []
+    print(f'\n{"case":<40} {"baseline":>12} {"current":>12} {"change":>8}')
+    for key, before_result in baseline.items():
+        if key.split('/', 1)[0] not in stages:
+            continue
+        before = before_result['p50_ms']
+        if key not in results:
+            print(f'{key:<40} {before:>10.2f}ms {"missing":>12} {"":>8} REGRESSION')
+            regressions.append(key)
+            continue
+        after = results[key]['p50_ms']
+        change = after / before - 1 if before > 0 else 0.0
+        marker = ' REGRESSION' if change > threshold else ''
+        print(f'{key:<40} {before:>10.2f}ms {after:>10.2f}ms {change:>+7.0%}{marker}')
+        if change > threshold:
+            regressions.append(key)
+    return regressions
+
+
+if __name__ == '__main__':
+    args = load_command_line_arguments()
+    os.environ['PUZZLE_SOLVER_CONFIG_FILE'] = args.config
+    assert os.path.exists(args.config), f'{args.config} does not exist'
+    log.basicConfig(level=log.WARNING)
+
+    stages = args.stages or list(STAGES.keys())
+    results, failures = run(stages, args.repeat, args.warmup)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'meta': {
+                    'timestamp': datetime.now(timezone.utc).isoformat(),
+                    'python': platform.python_version(),
+                    'platform': platform.platform(),
+                    'config': args.config,
+                    'repeat': args.repeat,
+                },
+                'results': results,
+                'failures': failures,
+            }, f, indent=2)
+
+    failed = bool(failures)
+    if failures:
+        print(f'\n{len(failures)} stages or cases failed: {", ".join(failures)}')
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)['results'], args.threshold, stages)
+        if regressions:
+            print(f'\n{len(regressions)} regressions found')
+            failed = True
+    if failed:
+        sys.exit(1)
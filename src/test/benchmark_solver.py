@@ -0,0 +1,90 @@
+import argparse
+import json
+import logging as log
+import os
+import statistics
+from time import perf_counter
+
+import numpy as np
+
+from puzzle_solver.models.grid_games import Sudoku
+from puzzle_solver.solver import SudokuSolver
+from puzzle_solver.solver.SolverProfile import PROFILES
+from puzzle_solver.solver.SudokuSolver import ENGINES, ENGINE_CP_SAT
+
+CONFIG_DEV_FILE = '../resources/config-dev.ini'
+SUDOKU_FILE = os.path.join(os.path.dirname(__file__), 'resources', 'sudokus.json')
+LARGE_SUDOKU_FILE = os.path.join(os.path.dirname(__file__), 'resources', 'sudokus-large.json')
+
+
+def load_command_line_arguments():
+    parser = argparse.ArgumentParser(description='Compares the solve times of the solver engines')
+    parser.add_argument("-c", "--config", default=CONFIG_DEV_FILE, help="config file to use")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="number of runs per puzzle")
+    parser.add_argument("-e", "--engines", nargs='+', default=ENGINES, choices=ENGINES, help="engines to compare")
+    parser.add_argument("-p", "--profiles", nargs='+', default=[],
+                        help=f"profiles of the cp-sat engine to compare, e.g. {' '.join(PROFILES.keys())}")
+    parser.add_argument("--large", action="store_true", help="use the hard 16x16 and 25x25 puzzles")
+    parser.add_argument("--no-presolve", action="store_true", help="hand the puzzles to the engines directly")
+    return parser.parse_args()
+
+
+def load_sudokus(path=SUDOKU_FILE):
+    """
+    Loads the puzzle corpus. 9x9 puzzles are stored as strings of 81 digits with 0 for empty fields,
+    larger puzzles as flat arrays of numbers.
+    :return: Dictionary of difficulty to list of Sudokus
+    """
+    with open(path) as f:
+        corpus = json.load(f)
+    return {
+        difficulty: [Sudoku.from_flat_array(np.array([int(c) for c in puzzle])) for puzzle in puzzles]
+        for difficulty, puzzles in corpus.items()
+    }
+
+
+def benchmark(solver, sudoku, repeat):
+    """
+    :return: Solve times in seconds and the solutions, None if the time limit of the solver was reached
+    """
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = perf_counter()
+        result = solver.solve(Sudoku(sudoku.initial_game()))
+        timings.append(perf_counter() - start)
+        if result.truncated:
+            return timings, None  # No need to wait for the time limit again
+    return timings, result.solutions
+
+
+if __name__ == '__main__':
+    args = load_command_line_arguments()
+    os.environ['PUZZLE_SOLVER_CONFIG_FILE'] = args.config
+    assert os.path.exists(args.config), f'{args.config} does not exist'
+    log.basicConfig(level=log.WARNING)
+
+    presolve = not args.no_presolve
+    solvers = {engine: SudokuSolver(engine, presolve=presolve) for engine in args.engines}
+    if ENGINE_CP_SAT in args.engines:
+        for profile in args.profiles:
+            solvers[f'{ENGINE_CP_SAT}:{profile}'] = SudokuSolver(ENGINE_CP_SAT, profile, presolve)
+    print(f'{"difficulty":<10} {"puzzle":>6} ' + ' '.join(f'{engine + " [ms]":>22}' for engine in solvers))
+    for difficulty, sudokus in load_sudokus(LARGE_SUDOKU_FILE if args.large else SUDOKU_FILE).items():
+        for i, sudoku in enumerate(sudokus):
+            results = {}
+            for engine, solver in solvers.items():
+                timings, solutions = benchmark(solver, sudoku, args.repeat)
+                results[engine] = (statistics.median(timings) * 1000, solutions)
+
+            # All engines which finished have to agree on the solutions
+            finished = [solutions for _, solutions in results.values() if solutions is not None]
+            for engine, (_, solutions) in results.items():
+                if solutions is not None:
+                    assert sorted(solution.game.tolist() for solution in solutions) \
+                           == sorted(solution.game.tolist() for solution in finished[0]), \
+                        f'{engine} found different solutions for {difficulty} puzzle {i}'
+
+            print(f'{difficulty:<10} {i:>6} ' + ' '.join(
+                f'{median:>22.2f}' if solutions is not None else f'{"timeout":>22}'
+                for median, solutions in results.values()))
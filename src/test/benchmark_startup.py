@@ -0,0 +1,94 @@
+"""
+Measures the startup of the server in fresh processes, with and without warm-up:
+
+- import: importing the server module
+- app: create_app, including the warm-up if enabled
+- first: first request (JSON and zip solve), the time a client waits after the server reports ready
+- second: the same requests again, for comparison
+- total: from starting to import the server until the first response is sent
+
+Every run starts a new interpreter, so no module or cache is shared between runs.
+
+Usage (from src/test):
+    PYTHONPATH=.. python benchmark_startup.py
+    PYTHONPATH=.. python benchmark_startup.py --runs 10 --config ../resources/config-prod.ini
+"""
+import argparse
+import json
+import logging as log
+import os
+import statistics
+import subprocess
+import sys
+from time import perf_counter
+
+CONFIG_DEV_FILE = '../resources/config-dev.ini'
+MODES = ['cold', 'warmup']
+COLUMNS = ['import', 'app', 'first', 'second', 'total']
+# Dependencies which should only be imported when their backend is used
+HEAVY_MODULES = ['cv2', 'ortools', 'pytesseract', 'tesserocr', 'pandas', 'tqdm', 'matplotlib', 'waitress']
+
+
+def load_command_line_arguments():
+    parser = argparse.ArgumentParser(description='Measures the startup time of the server in fresh processes')
+    parser.add_argument("-c", "--config", default=CONFIG_DEV_FILE, help="config file to use")
+    parser.add_argument("-r", "--runs", type=int, default=5, help="processes started per mode")
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def requests(client):
+    # The warm-up Sudoku is not used on purpose, so nothing is answered from a cache
+    sudoku = '530070000600195000098000060800060003400803001700020006060000280000419005000080079'
+    for response_format in ['json', 'zip']:
+        response = client.post('/sudoku', json={'sudoku': [int(c) for c in sudoku], 'format': response_format})
+        assert response.status_code == 200, f'/sudoku returned {response.status_code}'
+        response.get_data()
+
+
+def measure(mode):
+    """
+    Runs in the child process
+    :return: Durations in milliseconds by column and the heavy modules loaded once the app is ready
+    """
+    start = perf_counter()
+    from server import create_app
+    imported = perf_counter()
+    client = create_app(warmup=mode == 'warmup').test_client()
+    ready = perf_counter()
+    loaded = [module for module in HEAVY_MODULES if module in sys.modules]
+    requests(client)
+    first = perf_counter()
+    requests(client)
+    second = perf_counter()
+    return {
+        'import': (imported - start) * 1000,
+        'app': (ready - imported) * 1000,
+        'first': (first - ready) * 1000,
+        'second': (second - first) * 1000,
+        'total': (first - start) * 1000,
+        'loaded': loaded,
+    }
+
+
+def run(mode, config):
+    output = subprocess.run([sys.executable, __file__, '--config', config, '--child', mode], check=True,
+                            stdout=subprocess.PIPE, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+if __name__ == '__main__':
+    args = load_command_line_arguments()
+    os.environ['PUZZLE_SOLVER_CONFIG_FILE'] = args.config
+    assert os.path.exists(args.config), f'{args.config} does not exist'
+    if args.child is not None:
+        log.basicConfig(level=log.ERROR)
+        print(json.dumps(measure(args.child)))
+        sys.exit(0)
+
+    print(f'{"mode":<8} ' + ' '.join(f'{column + " [ms]":>12}' for column in COLUMNS) + '  loaded when ready')
+    for mode in MODES:
+        results = [run(mode, args.config) for _ in range(args.runs)]
+        medians = [statistics.median(result[column] for result in results) for column in COLUMNS]
+        print(f'{mode:<8} ' + ' '.join(f'{median:>12.1f}' for median in medians) + '  '
+              + ', '.join(results[-1]['loaded']))
@@ -0,0 +1,103 @@
+"""
+Fires parallel requests against /sudoku and checks that every response contains exactly the solution of its own puzzle.
+
+Runs against an in-process app by default, or against a running server using --url.
+"""
+import argparse
+import json
+import logging as log
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.request import Request, urlopen
+from zipfile import ZipFile
+
+from api.mappers import ImageMapper
+from benchmark_solver import SUDOKU_FILE
+from puzzle_solver.solver import SudokuSolver
+
+CONFIG_DEV_FILE = '../resources/config-dev.ini'
+
+
+def load_command_line_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-c", "--config", default=CONFIG_DEV_FILE, help="config file to use")
+    parser.add_argument("-u", "--url", help="base url of a running server, e.g. http://localhost:5001")
+    parser.add_argument("-t", "--threads", type=int, default=16, help="number of parallel clients")
+    parser.add_argument("-n", "--requests", type=int, default=200, help="total number of requests")
+    return parser.parse_args()
+
+
+def load_puzzles():
+    with open(SUDOKU_FILE) as f:
+        corpus = json.load(f)
+    return [[int(c) for c in puzzle] for puzzles in corpus.values() for puzzle in puzzles]
+
+
+def expected_solution_files(puzzles):
+    """
+    Solves every puzzle sequentially and renders the expected content of the zip file
+    """
+    from puzzle_solver.models.grid_games import Sudoku
+    import numpy as np
+
+    solver = SudokuSolver()
+    expected = []
+    for puzzle in puzzles:
+        result = solver.solve(Sudoku.from_flat_array(np.array(puzzle)))
+        data = b''.join(ImageMapper.from_images(solution.to_image() for solution in result.solutions))
+        with ZipFile(BytesIO(data)) as zf:
+            expected.append({name: zf.read(name) for name in zf.namelist()})
+    return expected
+
+
+def create_client(url):
+    if url is not None:
+        def post(payload):
+            request = Request(f'{url}/sudoku', json.dumps(payload).encode(), {'Content-Type': 'application/json'})
+            with urlopen(request) as response:
+                return response.status, dict(response.headers), response.read()
+        return post
+
+    from server import create_app
+    client = create_app().test_client()
+
+    def post(payload):
+        response = client.post('/sudoku', json=payload)
+        return response.status_code, response.headers, response.data
+    return post
+
+
+def check(index, post, puzzles, expected):
+    puzzle = index % len(puzzles)
+    status, headers, body = post({'sudoku': puzzles[puzzle], 'format': 'zip'})
+    if status != 200:
+        return f'request {index}: status {status}'
+    if headers.get('X-Solution-Count') != str(len(expected[puzzle])):
+        return f'request {index}: expected {len(expected[puzzle])} solutions, got {headers.get("X-Solution-Count")}'
+    with ZipFile(BytesIO(body)) as zf:
+        files = {name: zf.read(name) for name in zf.namelist()}
+    if files != expected[puzzle]:
+        return f'request {index}: solution of puzzle {puzzle} does not match'
+    return None
+
+
+if __name__ == '__main__':
+    args = load_command_line_arguments()
+    os.environ['PUZZLE_SOLVER_CONFIG_FILE'] = args.config
+    assert os.path.exists(args.config), f'{args.config} does not exist'
+    log.basicConfig(level=log.WARNING)
+
+    puzzles = load_puzzles()
+    expected = expected_solution_files(puzzles)
+    post = create_client(args.url)
+
+    with ThreadPoolExecutor(args.threads) as executor:
+        errors = [error for error in executor.map(lambda i: check(i, post, puzzles, expected), range(args.requests))
+                  if error is not None]
+
+    for error in errors:
+        print(error)
+    print(f'{args.requests - len(errors)} of {args.requests} requests returned the correct solution')
+    sys.exit(1 if errors else 0)
@@ -137,10 +137,10 @@ if __name__ == '__main__':
     log.debug('Solve Sudoku')
     solver = SudokuSolver()
     start = time()
-    solutions = solver.solve(sudoku)
+    result = solver.solve(sudoku)
     end = time()
     log.debug(f'Took {round(end - start, 2)}s to solve the Sudoku')
-    for solution in solutions:
+    for solution in result.solutions:
         plt.imshow(solution.to_image())
         solution.print()
     plt.show()
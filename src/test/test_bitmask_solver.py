@@ -0,0 +1,129 @@
+"""
+Usage (from src/test):
+    PYTHONPATH=.. python -m unittest test_bitmask_solver
+"""
+import logging
+import unittest
+
+import numpy as np
+
+from benchmark_solver import load_sudokus
+from puzzle_solver.models.grid_games import Sudoku
+from puzzle_solver.solver import BitmaskSudokuSolver, SudokuSolver
+from puzzle_solver.solver.SudokuSolver import ENGINE_CP_SAT
+from puzzle_solver.solver.SolverResult import STATUS_FEASIBLE, STATUS_INFEASIBLE, STATUS_OPTIMAL
+
+
+def solution_set(result):
+    return {solution.game.tobytes() for solution in result.solutions}
+
+
+def shifted_solution(cell_size):
+    """
+    :return: Solved board whose rows are shifted copies of each other
+    """
+    board_size = cell_size * cell_size
+    i, j = np.indices((board_size, board_size))
+    return (cell_size * (i % cell_size) + i // cell_size + j) % board_size + 1
+
+
+class BitmaskSudokuSolverTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        logging.disable(logging.ERROR)  # Infeasible Sudokus are logged as errors
+        cls.bitmask = BitmaskSudokuSolver()
+        cls.cp_sat = SudokuSolver(engine=ENGINE_CP_SAT, presolve=False)
+        cls.sudokus = [sudoku for sudokus in load_sudokus().values() for sudoku in sudokus]
+
+    @classmethod
+    def tearDownClass(cls):
+        logging.disable(logging.NOTSET)
+
+    def assert_valid(self, game):
+        digits = list(range(1, 10))
+        boxes = game.reshape(3, 3, 3, 3).swapaxes(1, 2).reshape(9, 9)
+        for unit in np.concatenate([game, game.T, boxes]):
+            self.assertEqual(sorted(unit), digits)
+
+    def assert_agree(self, game, max_solutions=None):
+        sudoku = Sudoku.from_flat_array(np.array(game).flatten())
+        result = self.bitmask.solve(sudoku, max_solutions)
+        expected = self.cp_sat.solve(sudoku, max_solutions)
+        self.assertEqual(result.status, expected.status)
+        self.assertEqual(result.truncated, expected.truncated)
+        self.assertEqual(solution_set(result), solution_set(expected))
+        for solution in result.solutions:
+            np.testing.assert_array_equal(solution.initial_game(), sudoku.initial_game())
+        return result
+
+    def test_unique_solutions(self):
+        for sudoku in self.sudokus:
+            with self.subTest(game=sudoku.game.tobytes()):
+                result = self.assert_agree(sudoku.game)
+                self.assertEqual(result.status, STATUS_OPTIMAL)
+                self.assertEqual(result.solution_count, 1)
+                self.assertFalse(result.truncated)
+
+    def test_all_solutions(self):
+        # Without the first three givens the puzzle has several solutions
+        game = self.sudokus[0].game.copy()
+        game[tuple(np.array(game.nonzero())[:, :3])] = 0
+        result = self.assert_agree(game)
+        self.assertEqual(result.status, STATUS_OPTIMAL)
+        self.assertGreater(result.solution_count, 1)
+
+    def test_larger_board(self):
+        game = shifted_solution(4)
+        game[::3, ::2] = 0
+        result = self.assert_agree(game)
+        self.assertGreaterEqual(result.solution_count, 1)
+
+    def test_max_solutions(self):
+        empty = Sudoku.from_flat_array(np.zeros(81, int))
+        for max_solutions in [1, 2, 10]:
+            with self.subTest(max_solutions=max_solutions):
+                result = self.bitmask.solve(empty, max_solutions)
+                self.assertEqual(result.status, STATUS_FEASIBLE)
+                self.assertTrue(result.truncated)
+                self.assertEqual(result.solution_count, max_solutions)
+                self.assertEqual(len(solution_set(result)), max_solutions)
+                for solution in result.solutions:
+                    self.assert_valid(solution.game)
+
+    def test_max_solutions_above_solution_count(self):
+        result = self.assert_agree(self.sudokus[0].game, 2)
+        self.assertEqual(result.status, STATUS_OPTIMAL)
+        self.assertFalse(result.truncated)
+
+    def test_infeasible(self):
+        # The second given of the first row is repeated in the first empty field of this row
+        game = self.sudokus[0].game.copy()
+        row = game[0]
+        row[np.flatnonzero(row == 0)[0]] = row[row != 0][1]
+        result = self.assert_agree(game)
+        self.assertEqual(result.status, STATUS_INFEASIBLE)
+        self.assertEqual(result.solution_count, 0)
+        self.assertFalse(result.truncated)
+
+    def test_infeasible_by_search(self):
+        # A number which fits its peers, but not the unique solution
+        sudoku = self.sudokus[-1]
+        solution = self.cp_sat.solve(sudoku).solutions[0].game
+        game = sudoku.game.copy()
+        i, j = np.argwhere(game == 0)[0]
+        candidates = set(range(1, 10)) - set(game[i]) - set(game[:, j]) \
+            - set(game[i - i % 3:i - i % 3 + 3, j - j % 3:j - j % 3 + 3].flatten()) - {solution[i, j]}
+        game[i, j] = min(candidates)
+        self.assertEqual(self.assert_agree(game).status, STATUS_INFEASIBLE)
+
+    def test_out_of_range(self):
+        game = self.sudokus[0].game.copy()
+        game[0, 0] = 10
+        result = self.bitmask.solve(Sudoku.from_flat_array(game.flatten()))
+        self.assertEqual(result.status, STATUS_INFEASIBLE)
+        self.assertEqual(result.solution_count, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
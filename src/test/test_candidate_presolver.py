@@ -0,0 +1,158 @@
+"""
+Usage (from src/test):
+    PYTHONPATH=.. python -m unittest test_candidate_presolver
+"""
+import logging
+import unittest
+
+import numpy as np
+
+from benchmark_solver import load_sudokus
+from puzzle_solver.models.grid_games import Sudoku
+from puzzle_solver.solver import CandidatePresolver, SudokuSolver
+from puzzle_solver.solver.CandidatePresolver import OUTCOME_INFEASIBLE, OUTCOME_SOLVED
+from puzzle_solver.solver.SudokuSolver import ENGINE_BITMASK, ENGINE_CP_SAT
+from puzzle_solver.solver.SolverResult import STATUS_INFEASIBLE, STATUS_OPTIMAL
+
+
+def solution_set(result):
+    return {solution.game.tobytes() for solution in result.solutions}
+
+
+def peers_contain(game, i, j, value):
+    box_i, box_j = i - i % 3, j - j % 3
+    return value in game[i] or value in game[:, j] or value in game[box_i:box_i + 3, box_j:box_j + 3]
+
+
+class CandidatePresolverTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        logging.disable(logging.ERROR)  # Infeasible Sudokus are logged as errors
+        cls.solvers = {
+            'presolve': SudokuSolver(engine=ENGINE_CP_SAT, presolve=True),
+            'cp-sat': SudokuSolver(engine=ENGINE_CP_SAT, presolve=False),
+            'bitmask': SudokuSolver(engine=ENGINE_BITMASK),
+        }
+        cls.presolver = CandidatePresolver(3)
+        cls.unique = [sudoku.game for sudokus in load_sudokus().values() for sudoku in sudokus]
+        cls.solutions = [cls.solve('cp-sat', game).solutions[0].game for game in cls.unique]
+
+    @classmethod
+    def tearDownClass(cls):
+        logging.disable(logging.NOTSET)
+
+    @classmethod
+    def solve(cls, name, game, max_solutions=None):
+        return cls.solvers[name].solve(Sudoku.from_flat_array(np.array(game).flatten()), max_solutions)
+
+    def multiple_solutions(self, game):
+        """
+        :return: The game with givens removed one by one until it has more than one solution
+        """
+        game = game.copy()
+        for i, j in zip(*game.nonzero()):
+            game[i, j] = 0
+            if self.solve('cp-sat', game, 2).solution_count > 1:
+                return game
+        self.fail('Sudoku has a unique solution without any givens')
+
+    @staticmethod
+    def contradiction(game, solution):
+        """
+        :return: The game with a number added which does not conflict with its peers, but with the unique solution
+        """
+        for i, j in zip(*(game == 0).nonzero()):
+            for value in range(1, 10):
+                if value != solution[i, j] and not peers_contain(game, i, j, value):
+                    infeasible = game.copy()
+                    infeasible[i, j] = value
+                    return infeasible
+        raise AssertionError('Every empty field only fits its solution')
+
+    def assert_engines_agree(self, game):
+        results = {name: self.solve(name, game) for name in self.solvers}
+        expected = results['cp-sat']
+        for name, result in results.items():
+            with self.subTest(engine=name):
+                self.assertEqual(result.status, expected.status)
+                self.assertFalse(result.truncated)
+                self.assertEqual(solution_set(result), solution_set(expected))
+        return expected
+
+    def test_unique_solutions(self):
+        for game in self.unique:
+            with self.subTest(game=game.tobytes()):
+                result = self.assert_engines_agree(game)
+                self.assertEqual(result.status, STATUS_OPTIMAL)
+                self.assertEqual(result.solution_count, 1)
+
+    def test_multiple_solutions(self):
+        for game in self.unique:
+            game = self.multiple_solutions(game)
+            with self.subTest(game=game.tobytes()):
+                result = self.assert_engines_agree(game)
+                self.assertEqual(result.status, STATUS_OPTIMAL)
+                self.assertGreater(result.solution_count, 1)
+
+    def test_infeasible(self):
+        for game, solution in zip(self.unique, self.solutions):
+            game = self.contradiction(game, solution)
+            with self.subTest(game=game.tobytes()):
+                self.assertEqual(self.assert_engines_agree(game).status, STATUS_INFEASIBLE)
+
+    def test_conflicting_givens(self):
+        game = self.unique[0].copy()
+        i, j = next(zip(*(game == 0).nonzero()))
+        game[i, j] = game[i][game[i] != 0][0]
+        self.assertEqual(self.presolver.presolve(game)[0], OUTCOME_INFEASIBLE)
+        self.assertEqual(self.assert_engines_agree(game).status, STATUS_INFEASIBLE)
+
+    def test_deductions_keep_the_solution(self):
+        for game, solution in zip(self.unique, self.solutions):
+            with self.subTest(game=game.tobytes()):
+                outcome, grid, candidates = self.presolver.presolve(game)
+                self.assertNotEqual(outcome, OUTCOME_INFEASIBLE)
+                filled = grid != 0
+                np.testing.assert_array_equal(grid[filled], solution[filled])
+                self.assertTrue(candidates[np.arange(9)[:, None], np.arange(9), solution - 1].all())
+                if outcome == OUTCOME_SOLVED:
+                    np.testing.assert_array_equal(grid, solution)
+
+    def test_naked_single(self):
+        game = self.solutions[0].copy()
+        game[4, 4] = 0
+        outcome, grid, _ = self.presolver.presolve(game)
+        self.assertEqual(outcome, OUTCOME_SOLVED)
+        np.testing.assert_array_equal(grid, self.solutions[0])
+
+    def test_hidden_single(self):
+        # The 1s of rows 1 and 2 and of columns 1 and 2 leave a single field of the top left box for a 1
+        game = np.zeros((9, 9), int)
+        game[1, 3] = game[2, 6] = game[3, 1] = game[6, 2] = 1
+        singles = self.presolver.presolve(game)[1]
+        self.assertEqual(singles[0, 0], 1)
+
+    def test_pointing(self):
+        # The 1 of the top left box can only be in its first row, so the rest of the first row loses it
+        candidates = np.ones((9, 9, 9), bool)
+        candidates[1:3, 0:3, 0] = False
+        self.presolver._eliminate_locked(candidates)
+        self.assertFalse(candidates[0, 3:, 0].any())
+        self.assertTrue(candidates[0, :3, 0].all())
+        self.assertTrue(candidates[1:, 3:, 0].all())
+        self.assertTrue(candidates[..., 1:].all())
+
+    def test_box_line_reduction(self):
+        # The 1 of the first row can only be in the top left box, so the other rows of this box lose it
+        candidates = np.ones((9, 9, 9), bool)
+        candidates[0, 3:, 0] = False
+        self.presolver._eliminate_locked(candidates)
+        self.assertFalse(candidates[1:3, :3, 0].any())
+        self.assertTrue(candidates[0, :3, 0].all())
+        self.assertTrue(candidates[3:, :, 0].all())
+        self.assertTrue(candidates[1:3, 3:, 0].all())
+
+
+if __name__ == '__main__':
+    unittest.main()
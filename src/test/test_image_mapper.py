@@ -0,0 +1,44 @@
+"""
+Usage (from src/test):
+    PYTHONPATH=.. python -m unittest test_image_mapper
+"""
+import unittest
+from io import BytesIO
+
+from PIL import Image
+
+from api.mappers import ImageMapper, ImageTooLargeError
+
+
+def encode(image, image_format='PNG'):
+    buffer = BytesIO()
+    image.save(buffer, image_format)
+    return buffer.getvalue()
+
+
+class ImageMapperTest(unittest.TestCase):
+
+    def test_decode(self):
+        decoded = ImageMapper.from_bytes(encode(Image.new('L', (40, 30), 255)), max_pixels=40 * 30)
+        self.assertEqual(decoded.shape, (30, 40))
+
+    def test_unsupported_format(self):
+        with self.assertRaises(ValueError) as context:
+            ImageMapper.from_bytes(b'no image')
+        self.assertNotIsInstance(context.exception, ImageTooLargeError)
+
+    def test_above_max_pixels(self):
+        with self.assertRaises(ImageTooLargeError):
+            ImageMapper.from_bytes(encode(Image.new('L', (40, 30))), max_pixels=40 * 30 - 1)
+
+    def test_decompression_bomb(self):
+        # 225 megapixels are above the limit of Pillow, which refuses to open the image at all
+        data = encode(Image.new('1', (15000, 15000)))
+        with self.assertRaises(ImageTooLargeError):
+            ImageMapper.from_bytes(data, max_pixels=10_000_000)
+        with self.assertRaises(ImageTooLargeError):
+            ImageMapper.from_bytes(data)
+
+
+if __name__ == '__main__':
+    unittest.main()
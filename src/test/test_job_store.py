@@ -0,0 +1,47 @@
+"""
+Usage (from src/test):
+    PYTHONPATH=.. python -m unittest test_job_store
+"""
+import unittest
+
+from api.caches import MemoryCacheBackend
+from api.jobs import JobStore
+from api.jobs.JobStore import STATUS_DONE, STATUS_FAILED, STATUS_QUEUED
+
+
+class JobStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = MemoryCacheBackend(max_entries=10)
+        self.store = JobStore(self.backend)
+
+    def test_poll_same_job_twice(self):
+        job = self.store.create()
+        self.assertEqual(self.store.get(job['id']), job)
+        self.assertEqual(self.store.get(job['id']), job)
+
+    def test_poll_after_update(self):
+        job = self.store.create()
+        self.store.update(job['id'], status=STATUS_DONE, result=[1, 2, 3])
+        for _ in range(2):
+            polled = self.store.get(job['id'])
+            self.assertEqual(polled['status'], STATUS_DONE)
+            self.assertEqual(polled['result'], [1, 2, 3])
+            self.assertNotIn('instance', polled)
+
+    def test_get_does_not_change_stored_job(self):
+        job = self.store.create()
+        self.store.get(job['id'])['status'] = STATUS_DONE
+        self.assertIn('instance', self.backend.get(job['id']))
+        self.assertEqual(self.store.get(job['id'])['status'], STATUS_QUEUED)
+
+    def test_job_of_other_instance_was_interrupted(self):
+        job = self.store.create()
+        other = JobStore(self.backend)
+        for _ in range(2):
+            self.assertEqual(other.get(job['id'])['status'], STATUS_FAILED)
+        self.assertEqual(self.store.get(job['id'])['status'], STATUS_QUEUED)
+
+
+if __name__ == '__main__':
+    unittest.main()
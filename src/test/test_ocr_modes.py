@@ -0,0 +1,89 @@
+"""
+Scans the images in PoC/img with every OCR mode and compares the results to PoC/img/labels.json.
+Skipped if tesseract is not installed, batch mode additionally needs tesserocr.
+
+Usage (from src/test):
+    PYTHONPATH=.. python -m unittest test_ocr_modes
+"""
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+from puzzle_solver.scanners.recognizers import TesseractRecognizer
+from puzzle_solver.scanners.recognizers.TesseractRecognizer import OCR_MODE_BATCH, OCR_MODE_MONTAGE, OCR_MODE_SINGLE
+from puzzle_solver.settings import CONFIG_FILE_VARIABLE
+
+IMAGE_DIRECTORY = os.path.join(os.path.dirname(__file__), '..', '..', 'PoC', 'img')
+
+OCR_CONFIG = """
+[general]
+log_level = 40
+[scanner]
+recognizer = tesseract
+[tesseract]
+ocr_mode = {ocr_mode}
+"""
+
+
+@unittest.skipUnless(shutil.which('tesseract'), 'tesseract is not installed')
+class OcrModesTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with open(os.path.join(IMAGE_DIRECTORY, 'labels.json')) as f:
+            cls.labels = {name: np.array(game) for name, game in json.load(f).items()}
+        cls.images = {name: cv2.imread(os.path.join(IMAGE_DIRECTORY, name), cv2.IMREAD_GRAYSCALE)
+                      for name in cls.labels}
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.previous_config = os.environ.get(CONFIG_FILE_VARIABLE)
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.previous_config is None:
+            os.environ.pop(CONFIG_FILE_VARIABLE, None)
+        else:
+            os.environ[CONFIG_FILE_VARIABLE] = cls.previous_config
+        cls.directory.cleanup()
+
+    def scan_all(self, ocr_mode):
+        """
+        :return: Dictionary of the scanned boards by image name
+        """
+        from puzzle_solver.scanners import SudokuScanner
+
+        config_file = os.path.join(self.directory.name, f'{ocr_mode}.ini')
+        with open(config_file, 'w') as f:
+            f.write(OCR_CONFIG.format(ocr_mode=ocr_mode))
+        os.environ[CONFIG_FILE_VARIABLE] = config_file
+        scanner = SudokuScanner()
+        return {name: scanner.scan(image).game for name, image in self.images.items()}
+
+    def assert_labels(self, scans):
+        for name, game in scans.items():
+            with self.subTest(image=name):
+                np.testing.assert_array_equal(game, self.labels[name])
+
+    def test_single(self):
+        self.assert_labels(self.scan_all(OCR_MODE_SINGLE))
+
+    @unittest.skipUnless(TesseractRecognizer.is_batch_available(), 'tesserocr is not installed')
+    def test_batch(self):
+        single = self.scan_all(OCR_MODE_SINGLE)
+        batch = self.scan_all(OCR_MODE_BATCH)
+        for name in self.images:
+            with self.subTest(image=name):
+                np.testing.assert_array_equal(batch[name], single[name])
+        self.assert_labels(batch)
+
+    def test_montage(self):
+        # Montage may read single tiles differently than single mode, hence only compared to the labels
+        self.assert_labels(self.scan_all(OCR_MODE_MONTAGE))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+"""
+Usage (from src/test):
+    PYTHONPATH=.. python -m unittest test_scan_cache
+"""
+import configparser
+import os
+import unittest
+
+import cv2
+import numpy as np
+
+from api.caches import MemoryCacheBackend, ScanCache
+from api.mappers import ImageMapper
+from puzzle_solver.models.grid_games import Sudoku
+
+IMAGE_FILE = os.path.join(os.path.dirname(__file__), '..', '..', 'PoC', 'img', 'sudoku-800x800.png')
+
+
+def create_config(text):
+    config = configparser.ConfigParser()
+    config.read_string(text)
+    return config
+
+
+class ScanCacheTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with open(IMAGE_FILE, 'rb') as f:
+            cls.png = f.read()
+        image = cv2.imread(IMAGE_FILE, cv2.IMREAD_GRAYSCALE)
+        cls.jpeg = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+        cls.other = cv2.imencode('.png', cv2.flip(image, 1))[1].tobytes()
+
+    def setUp(self):
+        self.backend = MemoryCacheBackend(max_entries=100)
+        self.scans = 0
+
+    def create_cache(self, config='[scanner]\n', **kwargs):
+        return ScanCache(self.backend, fingerprint=ScanCache.fingerprint(create_config(config)), **kwargs)
+
+    def scan(self, image):
+        self.scans += 1
+        return Sudoku.from_flat_array(np.full(81, self.scans))
+
+    def get_or_scan(self, cache, data):
+        return cache.get_or_scan(data, ImageMapper.from_bytes, self.scan).game[0, 0]
+
+    def test_same_bytes(self):
+        cache = self.create_cache()
+        self.assertEqual(self.get_or_scan(cache, self.png), 1)
+        self.assertEqual(self.get_or_scan(cache, self.png), 1)
+        self.assertEqual(self.scans, 1)
+        self.assertEqual(cache.statistics()['raw_hits'], 1)
+
+    def test_re_encoded_image(self):
+        cache = self.create_cache()
+        self.get_or_scan(cache, self.png)
+        self.assertEqual(self.get_or_scan(cache, self.jpeg), 1)
+        self.assertEqual(self.scans, 1)
+        self.assertEqual(cache.statistics()['perceptual_hits'], 1)
+        # The re-encoded image is now known by its bytes as well
+        self.get_or_scan(cache, self.jpeg)
+        self.assertEqual(cache.statistics()['raw_hits'], 1)
+
+    def test_re_encoded_image_without_perceptual_hash(self):
+        cache = self.create_cache(perceptual_hash=False)
+        self.get_or_scan(cache, self.png)
+        self.assertEqual(self.get_or_scan(cache, self.jpeg), 2)
+
+    def test_other_image(self):
+        cache = self.create_cache(max_distance=4)
+        self.get_or_scan(cache, self.png)
+        self.assertEqual(self.get_or_scan(cache, self.other), 2)
+
+    def test_changed_scanner_config(self):
+        self.get_or_scan(self.create_cache('[scanner]\nboard_size = 9\n'), self.png)
+        for config in ['[scanner]\nboard_size = 16\n', '[scanner]\nboard_size = 9\ntiling = grid\n',
+                       '[scanner]\nboard_size = 9\n[tesseract]\nocr_mode = batch\n',
+                       '[scanner]\nboard_size = 9\n[upload]\ndecode_size = 400\n']:
+            with self.subTest(config=config):
+                scans = self.scans
+                cache = self.create_cache(config)
+                self.assertEqual(self.get_or_scan(cache, self.png), scans + 1)
+                self.assertEqual(self.get_or_scan(cache, self.jpeg), scans + 1)
+
+    def test_unrelated_config(self):
+        self.get_or_scan(self.create_cache('[scanner]\nboard_size = 9\n'), self.png)
+        self.get_or_scan(self.create_cache('[scanner]\nboard_size = 9\n[cache]\nenabled = true\n'), self.png)
+        self.assertEqual(self.scans, 1)
+
+    def test_stored_under_own_hash(self):
+        cache = self.create_cache(max_distance=64)
+        self.get_or_scan(cache, self.png)
+        self.get_or_scan(cache, self.other)
+        image_hash = ScanCache.dhash(ImageMapper.from_bytes(self.other))
+        self.assertIsNotNone(self.backend.get(cache._hash_key(image_hash)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+"""
+Usage (from src/test):
+    PYTHONPATH=.. python -m unittest test_solution_cache
+"""
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from api.caches import MemoryCacheBackend, SolutionCache, SqliteCacheBackend
+from benchmark_solver import LARGE_SUDOKU_FILE, load_sudokus
+from puzzle_solver.models.grid_games import Sudoku, SudokuTransformation
+from puzzle_solver.solver import SudokuSolver
+
+
+def permutation_within_blocks(rng, cell_size, shuffle_blocks=True, shuffle_lines=True):
+    """
+    :return: Order of the lines which keeps the lines of a band (stack) together
+    """
+    blocks = rng.permutation(cell_size) if shuffle_blocks else np.arange(cell_size)
+    return np.concatenate([block * cell_size + (rng.permutation(cell_size) if shuffle_lines else np.arange(cell_size))
+                           for block in blocks])
+
+
+def transformations(rng, cell_size):
+    """
+    :return: Each kind of transformation on its own and a few combinations of all of them, by name
+    """
+    board_size = cell_size * cell_size
+    order = np.arange(board_size)
+    mapping = np.arange(board_size + 1)
+    yield 'digits', SudokuTransformation(False, order, order, np.concatenate([[0], rng.permutation(board_size) + 1]))
+    yield 'rows', SudokuTransformation(False, permutation_within_blocks(rng, cell_size, shuffle_blocks=False), order,
+                                       mapping)
+    yield 'columns', SudokuTransformation(False, order, permutation_within_blocks(rng, cell_size, shuffle_blocks=False),
+                                          mapping)
+    yield 'bands', SudokuTransformation(False, permutation_within_blocks(rng, cell_size, shuffle_lines=False), order,
+                                        mapping)
+    yield 'stacks', SudokuTransformation(False, order, permutation_within_blocks(rng, cell_size, shuffle_lines=False),
+                                         mapping)
+    yield 'transpose', SudokuTransformation(True, order, order, mapping)
+    for i in range(5):
+        yield f'combined {i}', SudokuTransformation(bool(rng.integers(2)), permutation_within_blocks(rng, cell_size),
+                                                    permutation_within_blocks(rng, cell_size),
+                                                    np.concatenate([[0], rng.permutation(board_size) + 1]))
+
+
+def sudoku_of(grid):
+    return Sudoku.from_flat_array(np.asarray(grid).flatten())
+
+
+class SolutionCacheTest(unittest.TestCase):
+    """
+    Runs against the memory backend, see SqliteSolutionCacheTest for the sqlite backend
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.solver = SudokuSolver()
+        cls.sudokus = [sudoku for sudokus in load_sudokus().values() for sudoku in sudokus]
+        cls.large_sudokus = [sudoku for sudokus in load_sudokus(LARGE_SUDOKU_FILE).values() for sudoku in sudokus]
+
+    def create_backend(self):
+        return MemoryCacheBackend(max_entries=1000)
+
+    def setUp(self):
+        self.cache = SolutionCache(self.create_backend())
+        self.solves = 0
+
+    def solve(self, sudoku):
+        self.solves += 1
+        return self.solver.solve(sudoku)
+
+    def test_symmetric_sudokus_share_the_entry(self):
+        rng = np.random.default_rng(0)
+        for index, sudoku in enumerate(self.sudokus):
+            solution = self.cache.get_or_solve(sudoku, None, self.solve).solutions[0].game
+            for name, transformation in transformations(rng, sudoku.get_cell_size()):
+                with self.subTest(puzzle=index, transformation=name):
+                    solves = self.solves
+                    transformed = sudoku_of(transformation.apply(sudoku.game))
+                    result = self.cache.get_or_solve(transformed, None, self.solve)
+                    self.assertEqual(self.solves, solves, 'Not found in cache')
+                    self.assertEqual(result.solution_count, 1)
+                    np.testing.assert_array_equal(result.solutions[0].game, transformation.apply(solution))
+                    np.testing.assert_array_equal(result.solutions[0].initial_game(), transformed.initial_game())
+
+    def test_symmetric_large_sudokus_are_canonical(self):
+        rng = np.random.default_rng(0)
+        for index, sudoku in enumerate(self.large_sudokus):
+            cell_size = sudoku.get_cell_size()
+            canonical, _ = SudokuTransformation.canonicalize(sudoku.game, cell_size)
+            for name, transformation in transformations(rng, cell_size):
+                with self.subTest(puzzle=index, transformation=name):
+                    transformed, _ = SudokuTransformation.canonicalize(transformation.apply(sudoku.game), cell_size)
+                    np.testing.assert_array_equal(transformed, canonical)
+
+    def test_multiple_solutions_map_back(self):
+        rng = np.random.default_rng(1)
+        game = self.sudokus[0].game.copy()
+        game[tuple(np.array(game.nonzero())[:, :4])] = 0
+        expected = self.cache.get_or_solve(sudoku_of(game), None, self.solve)
+        self.assertGreater(expected.solution_count, 1)
+        for name, transformation in transformations(rng, 3):
+            with self.subTest(transformation=name):
+                transformed = sudoku_of(transformation.apply(game))
+                result = self.cache.get_or_solve(transformed, None, self.solve)
+                self.assertEqual(self.solves, 1, 'Not found in cache')
+                self.assertEqual({solution.game.tobytes() for solution in result.solutions},
+                                 {solution.game.tobytes() for solution in self.solver.solve(transformed).solutions})
+
+    def test_different_sudokus_do_not_share_entries(self):
+        for sudoku in self.sudokus:
+            self.cache.get_or_solve(sudoku, None, self.solve)
+        self.assertEqual(self.solves, len(self.sudokus))
+
+        # Changing a single given leads to another Sudoku, which is not in the cache
+        game = self.sudokus[0].game.copy()
+        i, j = np.argwhere(game == 0)[0]
+        game[i, j] = self.cache.get_or_solve(self.sudokus[0], None, self.solve).solutions[0].game[i, j]
+        result = self.cache.get_or_solve(sudoku_of(game), None, self.solve)
+        self.assertEqual(self.solves, len(self.sudokus) + 1)
+        np.testing.assert_array_equal(result.solutions[0].initial_game(), game)
+
+    def test_max_solutions_is_part_of_the_key(self):
+        self.cache.get_or_solve(self.sudokus[0], None, self.solve)
+        self.cache.get_or_solve(self.sudokus[0], 2, self.solve)
+        self.assertEqual(self.solves, 2)
+
+
+class SqliteSolutionCacheTest(SolutionCacheTest):
+
+    def create_backend(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return SqliteCacheBackend(os.path.join(directory.name, 'solutions.sqlite'), max_entries=1000, table='solutions')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+"""
+Usage (from src/test):
+    PYTHONPATH=.. python -m unittest test_sudoku_image
+"""
+import unittest
+
+import cv2
+import numpy as np
+
+from puzzle_solver.models.grid_games import Sudoku
+from puzzle_solver.models.grid_games.Sudoku import FONT, FONT_THICKNESS, GIVEN_COLOR, SOLVED_COLOR, \
+    get_optimal_font_scale
+
+SOLUTION = '534678912672195348198342567859761423426853791713924856961537284287419635345286179'
+
+
+def draw_image(sudoku, width, height):
+    """
+    Draws the board line by line and number by number like the renderer before glyph caching
+    """
+    image = np.full((height, width, 3), 255, np.uint8)
+    x_step = width // 9
+    y_step = height // 9
+    font_scale = get_optimal_font_scale('0', x_step - 20, y_step - (height // 25))
+    for k in range(1, 9):
+        cv2.line(image, (0, k * y_step + (y_step // 5)), (width, k * y_step + (y_step // 5)), (0, 0, 0), 2)
+        cv2.line(image, (k * x_step, 0), (k * x_step, height), (0, 0, 0), 2)
+
+    initial_game = sudoku.initial_game()
+    for i, row in enumerate(sudoku.game):
+        for j, value in enumerate(row):
+            if value != 0:
+                color = GIVEN_COLOR if initial_game[i][j] != 0 else SOLVED_COLOR
+                cv2.putText(image, str(value), (x_step // 5 + j * x_step, (i + 1) * y_step), FONT, font_scale, color,
+                            FONT_THICKNESS)
+    return image
+
+
+class SudokuImageTest(unittest.TestCase):
+
+    def setUp(self):
+        solution = np.array([int(value) for value in SOLUTION]).reshape(9, 9)
+        initial = solution.copy()
+        initial[np.random.default_rng(0).random((9, 9)) < 0.6] = 0
+        self.sudoku = Sudoku(initial)
+        self.sudoku.game = solution
+
+    def test_matches_drawn_image(self):
+        # 200x200 leaves no room for the margins, numbers reach into the neighbouring fields and overlap
+        for width, height in [(500, 500), (300, 300), (200, 200), (900, 900), (640, 480), (450, 800)]:
+            with self.subTest(width=width, height=height):
+                expected = draw_image(self.sudoku, width, height)
+                np.testing.assert_array_equal(self.sudoku.to_image(width, height), expected)
+
+    def test_cached_rendering_is_not_modified(self):
+        first = self.sudoku.to_image()
+        self.sudoku.to_image().fill(0)
+        np.testing.assert_array_equal(self.sudoku.to_image(), first)
+
+
+if __name__ == '__main__':
+    unittest.main()
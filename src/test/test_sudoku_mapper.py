@@ -0,0 +1,56 @@
+"""
+Usage (from src/test):
+    PYTHONPATH=.. python -m unittest test_sudoku_mapper
+"""
+import unittest
+
+import numpy as np
+
+from api.mappers import SudokuMapper
+
+
+class SudokuMapperTest(unittest.TestCase):
+
+    def test_flat_and_2d(self):
+        flat = SudokuMapper.from_json({'sudoku': list(range(10)) * 8 + [9]})
+        board = SudokuMapper.from_json({'sudoku': np.zeros((16, 16), int).tolist()})
+        self.assertEqual(flat.get_height(), 9)
+        self.assertEqual(flat.game[1, 0], 9)
+        self.assertEqual(board.get_height(), 16)
+
+    def test_value_above_board_size(self):
+        game = np.zeros((9, 9), int)
+        game[4, 4] = 10
+        with self.assertRaisesRegex(ValueError, 'between 0 \\(empty\\) and 9. Got 10'):
+            SudokuMapper.from_json({'sudoku': game.tolist()})
+
+    def test_negative_value(self):
+        with self.assertRaises(ValueError):
+            SudokuMapper.from_json({'sudoku': [-1] + [0] * 80})
+
+    def test_largest_value_of_larger_board(self):
+        game = np.zeros((16, 16), int)
+        game[0, 0] = 16
+        self.assertEqual(SudokuMapper.from_json({'sudoku': game.tolist()}).game[0, 0], 16)
+        game[0, 0] = 17
+        with self.assertRaises(ValueError):
+            SudokuMapper.from_json({'sudoku': game.tolist()})
+
+    def test_no_integers(self):
+        for value in [1.5, '1', None]:
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    SudokuMapper.from_json({'sudoku': [value] + [0] * 80})
+
+    def test_max_solutions(self):
+        self.assertIsNone(SudokuMapper.max_solutions_from_json({}))
+        self.assertEqual(SudokuMapper.max_solutions_from_json({'max_solutions': '3'}), 3)
+        self.assertEqual(SudokuMapper.max_solutions_from_json({'unique': 'true', 'max_solutions': 5}), 2)
+        for max_solutions in [0, -1, 'all']:
+            with self.subTest(max_solutions=max_solutions):
+                with self.assertRaises(ValueError):
+                    SudokuMapper.max_solutions_from_json({'max_solutions': max_solutions})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+"""
+Usage (from src/test):
+    PYTHONPATH=.. python -m unittest test_sudoku_service
+"""
+import os
+import tempfile
+import unittest
+from time import perf_counter
+
+import numpy as np
+
+from puzzle_solver.models.grid_games import Sudoku
+from puzzle_solver.settings import CONFIG_FILE_VARIABLE
+
+WORKER_TIMEOUT = 2
+
+OFFLOAD_CONFIG = f"""
+[general]
+log_level = 40
+[solver]
+engine = cp-sat
+[workers]
+offload = true
+processes = 1
+timeout = {WORKER_TIMEOUT}
+"""
+
+
+class OffloadedSolveTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        config_file = os.path.join(cls.directory.name, 'config.ini')
+        with open(config_file, 'w') as f:
+            f.write(OFFLOAD_CONFIG)
+        cls.previous_config = os.environ.get(CONFIG_FILE_VARIABLE)
+        os.environ[CONFIG_FILE_VARIABLE] = config_file
+
+        from api.services import SudokuService
+        cls.service = SudokuService()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.service._pool.shutdown()
+        if cls.previous_config is None:
+            del os.environ[CONFIG_FILE_VARIABLE]
+        else:
+            os.environ[CONFIG_FILE_VARIABLE] = cls.previous_config
+        cls.directory.cleanup()
+
+    def test_solve_stops_before_timeout(self):
+        # An empty board has far more solutions than can be enumerated before the timeout
+        sudoku = Sudoku.from_flat_array(np.zeros(81, int))
+        start = perf_counter()
+        result = self.service.solve_sudoku(sudoku, max_solutions=10 ** 9)
+        self.assertLess(perf_counter() - start, WORKER_TIMEOUT)
+        self.assertTrue(result.truncated)
+        self.assertTrue(result.is_solved())
+
+    def test_solve_within_timeout(self):
+        sudoku = Sudoku.from_flat_array(np.array([int(c) for c in
+                                                  '530070000600195000098000060800060003400803001700020006'
+                                                  '060000280000419005000080079']))
+        result = self.service.solve_sudoku(sudoku)
+        self.assertFalse(result.truncated)
+        self.assertEqual(result.solution_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()